@@ -1,27 +1,51 @@
 # backend/app.py
 from fastapi import FastAPI, UploadFile, File, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import os
+from collections import defaultdict
+from functools import partial
 import pandas as pd
-from io import BytesIO, StringIO
+import json
+import uuid
 
 # Always use package-qualified imports
-from backend.models.preprocess import preprocess
-import numpy as np
-from backend.models.cluster import run_ward, cluster_summary, herd_kpis
-from backend.models.recommend import cluster_recommendations
-from backend.utils.schema import REQUIRED_COLUMNS
-
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from scipy.cluster.hierarchy import dendrogram, ward
-from sklearn.metrics import adjusted_rand_score
-import csv
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import tempfile
-import os
+from backend.models.distributions import HISTOGRAM_BINS, MAX_OUTLIERS, cluster_distributions
+from backend.models.cluster import AUTO_K_BUDGET_SECONDS, CLUSTER_MODES, SILHOUETTE_SAMPLE, compare_cuts, score_cuts
+from backend.models.pipeline import (
+    cluster_csv, cluster_dataframe, cluster_dataset, run_matrix, select_season, split_groups,
+)
+from backend.models.preprocess import coerce_types
+from backend.models.reduce import REDUCE_METHODS, REDUCE_VARIANCE
+from backend.models.recommend import RULES, cluster_recommendations, cluster_rollup, evaluate_rules
+from backend.models.sensors import ingest_readings
+from backend.utils.datasets import DatasetStore
+from backend.utils.exports import (
+    REPORT_FORMATS, iter_csv, iter_report_csv, iter_report_pdf, recommendations_frame, recommendations_pdf,
+)
+from backend.utils.ingest import CSVParseError, UploadTooLarge, iter_upload, read_csv, scan_csv, spool_upload
+from backend.utils.jobs import JobManager, QueueFull
+from backend.utils.metrics import (
+    CACHE_BYTES, CACHE_ENTRIES, JOBS_ACTIVE, JOBS_CAPACITY, METRICS_ENABLED, PROMETHEUS_MEDIA_TYPE, MetricsMiddleware,
+    StageTimer, expose, record,
+)
+from backend.utils.responses import (
+    ARROW_MEDIA_TYPE, LAYOUTS, MSGPACK_MEDIA_TYPES, NDJSON_MEDIA_TYPE, arrow_response, assignments_frame, cache_key,
+    check_page, cluster_response, encode_json, etag, etag_matches, frame_payload, parse_fields, records_page, render,
+    wants,
+)
+from backend.utils.schema import HERD_COL, NUMERIC, REQUIRED_COLUMNS
+from backend.utils.plots import dendrogram_coords, dendrogram_png, distribution_grid_png
+from backend.utils.store import ResultStore
+from backend.utils.warmup import EAGER_IMPORTS, WARMUP, start_warm_up, warm_up
+
+# Plotting (matplotlib), PDF (reportlab) and comparison (scipy/sklearn)
+# dependencies are imported inside the endpoints that use them, so a worker
+# that only validates uploads starts fast.
+if EAGER_IMPORTS:
+    warm_up()
 
 app = FastAPI(title="HERD-V Backend", version="1.0")
 
@@ -35,42 +59,318 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency, sizes, rows and per-stage timings for /metrics and the
+# Server-Timing header; HERDV_METRICS=0 leaves them out entirely
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+# Clustering runs keyed by the run_id that /cluster returns. Follow-up
+# endpoints take that run_id; without one they fall back to this process's
+# most recent run so older clients keep working.
+results = ResultStore()
+
+
+def _get_run(run_id: str | None):
+    """Return (run, error_response) for `run_id`, or for the latest run if omitted."""
+    if run_id:
+        run = results.get(run_id)
+        if run is None:
+            return None, JSONResponse({"error": "Unknown or expired run_id."}, status_code=404)
+        return run, None
+    _, run = results.latest()
+    if run is None:
+        return None, JSONResponse({"error": "No clustering run yet."}, status_code=400)
+    return run, None
+
+
+# Rendered dendrograms per (run_id, parameters); repeat views are free
+renders = ResultStore(max_entries=int(os.environ.get("HERDV_RENDER_CACHE_ENTRIES", "128")),
+                      max_bytes=int(os.environ.get("HERDV_RENDER_CACHE_BYTES", str(64 * 1024 * 1024))),
+                      disk_dir=None, name="render")
+
+# Content-addressed /cluster cache. `inputs` maps a hash of the normalized
+# upload (or a dataset version) plus the clustering parameters to the run_id
+# it produced, so a resent herd reuses its run (and the run's follow-up
+# caches); `responses` holds encoded /cluster bodies per run and view.
+inputs = ResultStore(max_entries=int(os.environ.get("HERDV_INPUT_CACHE_ENTRIES", "1024")), disk_dir=None,
+                     name="input")
+responses = ResultStore(max_entries=int(os.environ.get("HERDV_RESPONSE_CACHE_ENTRIES", "64")),
+                        max_bytes=int(os.environ.get("HERDV_RESPONSE_CACHE_BYTES", str(128 * 1024 * 1024))),
+                        disk_dir=None, name="response")
+
+
+# CPU-bound clustering runs in worker processes so a big upload cannot stall
+# the event loop. Uploads up to SYNC_MAX_BYTES (about 5k animals) stay on the
+# in-process fast path, where pool hand-off would cost more than it saves.
+SYNC_MAX_BYTES = int(os.environ.get("HERDV_SYNC_MAX_BYTES", str(512 * 1024)))
+jobs = JobManager()
+
+
+@app.on_event("startup")
+def _start_warm_up():
+    if WARMUP and not EAGER_IMPORTS:
+        start_warm_up()
+
+
+@app.on_event("shutdown")
+def _shutdown_jobs():
+    jobs.shutdown()
+
+
+def _store_run(run: dict) -> str:
+    """Store a finished pipeline run and return its run_id (the job result)."""
+    run["run_id"] = uuid.uuid4().hex
+    return results.put(run, run["run_id"])
+
+
+# Uploaded herds, parsed once and kept on disk as memory-mapped columnar
+# files; /cluster and the follow-up endpoints accept their dataset_id
+datasets = DatasetStore()
+# Latest run_id per dataset_id, for follow-up endpoints given only a dataset
+dataset_runs: dict[str, str] = {}
+# Serializes sensor appends per dataset within this worker
+dataset_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+def _store_dataset_run(dataset_id: str, run: dict) -> str:
+    run["dataset_id"] = dataset_id
+    run_id = _store_run(run)
+    dataset_runs[dataset_id] = run_id
+    return run_id
+
+
+async def _cluster_stored_dataset(dataset_id: str, n_clusters: int = 4, mode: str = "auto",
+                                  season: str | None = None, **reduction):
+    """Cluster a stored dataset and store the run; returns (run, error_response)."""
+    path = datasets.path(dataset_id)
+    if path is None:
+        return None, JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+    if os.path.getsize(path) <= SYNC_MAX_BYTES:
+        run = await run_in_threadpool(cluster_dataset, path, n_clusters=n_clusters, mode=mode, season=season,
+                                      **reduction)
+    else:
+        run = await jobs.run(cluster_dataset, path, n_clusters=n_clusters, mode=mode, season=season, **reduction)
+    # sizing the run (and pickling it to disk) is CPU work; keep it off the loop
+    await run_in_threadpool(_store_dataset_run, dataset_id, run)
+    return run, None
+
+
+async def _resolve_run(run_id: str | None, dataset_id: str | None):
+    """Like _get_run, but a dataset_id alone selects that dataset's latest run.
+
+    A dataset that has no live run yet is clustered with the defaults first.
+    """
+    if run_id or not dataset_id:
+        return _get_run(run_id)
+    run = results.get(dataset_runs[dataset_id]) if dataset_id in dataset_runs else None
+    if run is not None:
+        return run, None
+    try:
+        return await _cluster_stored_dataset(dataset_id)
+    except QueueFull as e:
+        return None, JSONResponse({"error": str(e)}, status_code=429)
+
+
+def _reduction(reduce: str, variance: float, projection_run_id: str | None):
+    """Return (cluster_dataframe reduction kwargs, error_response) for the query parameters.
+
+    `projection_run_id` reuses that run's encoder and projection, so a new
+    herd is clustered in the same feature space; it excludes `reduce`.
+    """
+    if reduce not in REDUCE_METHODS:
+        return None, JSONResponse({"error": f"Invalid reduce. Use one of: {', '.join(REDUCE_METHODS)}."},
+                                  status_code=400)
+    if not 0 < variance <= 1:
+        return None, JSONResponse({"error": "variance must be in (0, 1]."}, status_code=400)
+    if projection_run_id is None:
+        return {"reduce": reduce, "variance": variance}, None
+    if reduce != "none":
+        return None, JSONResponse({"error": "Use either reduce or projection_run_id, not both."}, status_code=400)
+    run, error = _get_run(projection_run_id)
+    if error is not None:
+        return None, error
+    assigner = run["assigner"]
+    return {"space": (assigner.encoder, assigner.projection)}, None
+
+
+def _input_key(upload, dataset_id: str | None, n_clusters: int, mode: str, season: str | None,
+               *options) -> str | None:
+    """Cache key of a clustering request's input and parameters, or None if it cannot be cached."""
+    if dataset_id:
+        # a dataset's file is rewritten when readings are appended
+        path = datasets.path(dataset_id)
+        if path is None:
+            return None
+        source = ("dataset", dataset_id, os.path.getmtime(path))
+    elif upload is not None and upload.digest is not None:
+        source = ("csv", upload.digest)
+    else:
+        return None
+    return cache_key(*source, n_clusters, mode, season, *options)
+
+
+def _cached_run(key: str | None) -> dict | None:
+    entry = inputs.get(key) if key else None
+    return None if entry is None else results.get(entry["run_id"])
+
+
+def _not_modified(request: Request, run: dict) -> tuple[str, Response | None]:
+    """ETag of a GET view of a run, and a 304 response if the client already has it.
+
+    A run never changes once stored, so the tag is just its run_id plus the
+    endpoint and query parameters.
+    """
+    tag = etag(run["run_id"], request.url.path, sorted(request.query_params.multi_items()))
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return tag, Response(status_code=304, headers={"ETag": tag})
+    return tag, None
+
+
+def _cluster_count_error(k: int, name: str = "n_clusters", leaves: int | None = None) -> JSONResponse | None:
+    """400 response for a number of clusters below 1 (or above a tree's `leaves`), else None."""
+    if k < 1:
+        return JSONResponse({"error": f"{name} must be at least 1."}, status_code=400)
+    if leaves is not None and k > leaves:
+        return JSONResponse({"error": f"{name} must be at most {leaves}, the run's number of leaves."},
+                            status_code=400)
+    return None
+
+
+def _clustering_error(mode: str, n_clusters: int) -> JSONResponse | None:
+    """400 response for an invalid clustering mode or number of clusters, else None."""
+    if mode not in CLUSTER_MODES:
+        return JSONResponse({"error": f"Invalid mode. Use one of: {', '.join(CLUSTER_MODES)}."}, status_code=400)
+    return _cluster_count_error(n_clusters)
+
 
-def _read_csv_bytes(content: bytes) -> pd.DataFrame:
-    """Read CSV bytes into a DataFrame with robust cleaning.
+def _layout_error(layout: str) -> JSONResponse | None:
+    """400 response for an unknown per-animal layout, else None."""
+    if layout not in LAYOUTS:
+        return JSONResponse({"error": f"Invalid layout. Use one of: {', '.join(LAYOUTS)}."}, status_code=400)
+    return None
 
-    - skipinitialspace to handle spaces after delimiters
-    - strip column names
-    - strip whitespace from string cells
+
+def _response_options(fields: str | None, layout: str, records_offset: int, records_limit: int | None):
+    """Validate the section selector, layout and paging shared by the run endpoints.
+
+    Returns (selected sections, error_response).
     """
-    # Use skipinitialspace to handle cases like '7. 0' where an extra space follows a comma
-    df = pd.read_csv(BytesIO(content), skipinitialspace=True)
-    # Normalize column names
-    df.columns = [str(c).strip() for c in df.columns]
-    # Trim whitespace from string columns
-    for col in df.select_dtypes(include=[object]).columns:
-        df[col] = df[col].astype(str).str.strip()
-    return df
-
-_last_linkage = None
-_last_clusters = None
-_last_means = None
-_last_counts = None
-_last_df = None
+    error = _layout_error(layout)
+    if error is not None:
+        return None, error
+    try:
+        check_page(records_offset, records_limit)
+        return parse_fields(fields), None
+    except ValueError as e:
+        return None, JSONResponse({"error": str(e)}, status_code=400)
 
 # ---------------- Schema Validation ----------------
 @app.post("/schema/validate")
 async def validate_csv(request: Request, file: UploadFile | None = File(None)):
     # Accept either a multipart upload (file) or raw CSV bytes in the request body.
-    if file is not None:
-        content = await file.read()
-    else:
-        # read raw body (useful for web clients that send the CSV bytes directly)
-        content = await request.body()
-    df = _read_csv_bytes(content)
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    preview = df.head(10).to_dict(orient="records")
-    return {"missing": missing, "preview": preview, "rows": len(df)}
+    # The upload is streamed: only the header and preview rows are parsed and
+    # the remaining rows are counted, so no full DataFrame is ever built.
+    try:
+        columns, preview_df, rows = await scan_csv(iter_upload(request, file))
+    except CSVParseError as e:
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    record(request, rows=rows)
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    preview = preview_df.to_dict(orient="records")
+    return {"missing": missing, "preview": preview, "rows": rows}
+
+# ---------------- Datasets ----------------
+@app.post("/datasets", status_code=201)
+async def upload_dataset(
+    request: Request,
+    file: UploadFile | None = File(None),
+    records: list[dict] | None = Body(None),
+):
+    """Upload a herd once; it is parsed, typed and stored for reuse by dataset_id.
+
+    Accepts the same inputs as /cluster. Returns the dataset_id with its row
+    count, columns and on-disk size.
+    """
+    upload, df, error = await _read_cluster_input(request, file, records)
+    if error is not None:
+        return error
+    timer = StageTimer()
+    try:
+        if df is None:
+            with timer.stage("parse"):
+                df = await run_in_threadpool(read_csv, upload.source)
+        with timer.stage("store"):
+            df = await run_in_threadpool(coerce_types, df)
+            info = await run_in_threadpool(datasets.put, df)
+    except CSVParseError as e:
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        if upload is not None:
+            upload.close()
+    record(request, timer.stages, rows=info["rows"])
+    return JSONResponse(info, status_code=201)
+
+
+@app.get("/datasets/{dataset_id}")
+async def get_dataset(dataset_id: str):
+    info = await run_in_threadpool(datasets.info, dataset_id)
+    if info is None:
+        return JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+    return {**info, "latest_run_id": dataset_runs.get(dataset_id)}
+
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    if not datasets.delete(dataset_id):
+        return JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+    dataset_runs.pop(dataset_id, None)
+    dataset_locks.pop(dataset_id, None)
+    return {"deleted": dataset_id}
+
+
+@app.post("/datasets/{dataset_id}/readings")
+async def append_readings(dataset_id: str, request: Request, file: UploadFile | None = File(None)):
+    """Append raw sensor readings (CSV) to a dataset and refresh its sensor features.
+
+    Columns: ID, Timestamp and any of the reading columns in SENSOR_READINGS.
+    Readings are aggregated per animal and day into the dataset's daily state
+    and the features are recomputed over the trailing window, so the next
+    /cluster?dataset_id= uses them. Only the appended readings are parsed.
+    """
+    if datasets.path(dataset_id) is None:
+        return JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+    try:
+        upload = await spool_upload(iter_upload(request, file))
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    try:
+        # appends to one dataset must not interleave: each rewrites its state
+        async with dataset_locks[dataset_id]:
+            path = datasets.path(dataset_id)
+            if path is None:
+                return JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+            if upload.size <= SYNC_MAX_BYTES:
+                result = await run_in_threadpool(ingest_readings, path, upload.source)
+            else:
+                result = await jobs.run(ingest_readings, path, upload.source)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    except CSVParseError as e:
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        upload.close()
+    # the latest run was clustered on the old features
+    dataset_runs.pop(dataset_id, None)
+    record(request, result.pop("timings"), rows=result["readings"])
+    return {"dataset_id": dataset_id, **result}
+
 
 # ---------------- Clustering ----------------
 @app.post("/cluster")
@@ -78,225 +378,803 @@ async def cluster(
     request: Request,
     file: UploadFile | None = File(None),
     records: list[dict] | None = Body(None),
+    dataset_id: str | None = None,
     n_clusters: int = 4,
-    season: str | None = None
+    season: str | None = None,
+    mode: str = "auto",
+    reduce: str = "none",
+    variance: float = REDUCE_VARIANCE,
+    projection_run_id: str | None = None,
+    fields: str | None = None,
+    records_offset: int = 0,
+    records_limit: int | None = None,
+    layout: str = "rows",
 ):
+    """Cluster a herd and return the selected response sections.
+
+    The herd is uploaded (CSV file, raw CSV body or JSON records) or, with
+    `dataset_id`, taken from the dataset store without any parsing.
+    fields: comma-separated subset of the response sections (default: all).
+    season: cluster only the rows whose Season column matches.
+    reduce: 'pca' or 'randomized' projects the features onto the fewest columns
+    keeping `variance` of their variance before Ward; `clustering.reduction`
+    reports the variance retained and the fit time.
+    projection_run_id: encode and project like that run (same feature space).
+    records_offset/records_limit: page through `labeled_records`.
+    layout: 'rows' (list of dicts) or 'columns' (dict of column arrays) for
+    the per-animal sections. Send `Accept: application/msgpack` for msgpack.
+    """
+    error = _clustering_error(mode, n_clusters)
+    if error is not None:
+        return error
+    selected, error = _response_options(fields, layout, records_offset, records_limit)
+    if error is not None:
+        return error
+    reduction, error = _reduction(reduce, variance, projection_run_id)
+    if error is not None:
+        return error
+
+    upload, df = None, None
+    if not dataset_id:
+        upload, df, error = await _read_cluster_input(request, file, records)
+        if error is not None:
+            return error
+
+    # A herd resent with the same parameters reuses its run: no parse, no tree
+    key = _input_key(upload, dataset_id, n_clusters, mode, season, reduce, variance, projection_run_id)
+    run = _cached_run(key)
+    hit = run is not None
+    try:
+        if hit:
+            # clients that send no run_id follow the latest run: make it this one
+            results.touch(run["run_id"])
+            if dataset_id:
+                dataset_runs[dataset_id] = run["run_id"]
+        elif dataset_id:
+            run, error = await _cluster_stored_dataset(dataset_id, n_clusters=n_clusters, mode=mode, season=season,
+                                                       **reduction)
+            if error is not None:
+                return error
+        elif df is not None:
+            run = await run_in_threadpool(cluster_dataframe, df, n_clusters=n_clusters, mode=mode, season=season,
+                                          **reduction)
+        elif upload.size <= SYNC_MAX_BYTES:
+            run = await run_in_threadpool(cluster_csv, upload.source, n_clusters=n_clusters, mode=mode, season=season,
+                                          **reduction)
+        else:
+            run = await jobs.run(cluster_csv, upload.source, n_clusters=n_clusters, mode=mode, season=season,
+                                 **reduction)
+    except CSVParseError as e:
+        # If CSV parse failed, return the parse error for easier debugging
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    finally:
+        if upload is not None:
+            upload.close()
+    if not hit:
+        if dataset_id is None:
+            await run_in_threadpool(_store_run, run)
+        if key:
+            inputs.put({"run_id": run["run_id"]}, key)
+    run_id = run["run_id"]
+
+    accept = request.headers.get("accept")
+    view = cache_key(run_id, ",".join(selected), records_offset, records_limit, layout,
+                     wants(accept, MSGPACK_MEDIA_TYPES))
+    cached = responses.get(view)
+    if cached is None:
+        timer = StageTimer()
+        with timer.stage("serialize"):
+            body = await run_in_threadpool(cluster_response, run_id, run, selected, records_offset, records_limit,
+                                           layout)
+            response = await run_in_threadpool(render, body, accept)
+        # huge bodies would push everything else out of the cache
+        if len(response.body) <= responses.max_bytes // 4:
+            responses.put({"body": response.body, "media_type": response.media_type}, view)
+        record(request, timer.stages if hit else {**run["timings"], **timer.stages}, rows=len(run["df"]))
+    else:
+        response = Response(content=cached["body"], media_type=cached["media_type"])
+        record(request, rows=len(run["df"]))
+    response.headers["X-Cache"] = "hit" if hit else "miss"
+    return response
+
+
+async def _read_cluster_input(request: Request, file: UploadFile | None, records: list[dict] | None):
+    """Return (spooled_upload, records_frame, error_response) for a clustering request.
+
+    CSV bodies are streamed into a SpooledUpload (memory, then a temp file)
+    under the configured size limit instead of being buffered whole.
+    """
     # Support three upload modes:
     # 1) multipart/form-data with UploadFile (file)
     # 2) raw CSV bytes in the request body (useful for web clients sending text/csv)
     # 3) JSON body with `records` (list of dicts)
     if file is not None:
-        content = await file.read()
-        df = _read_csv_bytes(content)
-    else:
-        # Try raw request body bytes first if present (this covers web clients
-        # that send text/csv or other content-types). If body is empty, fall
-        # back to JSON `records`.
-        # Debug logging to help diagnose client issues
+        return await _spool(request, file)
+
+    # Try raw request body bytes first if present (this covers web clients
+    # that send text/csv or other content-types). If body is empty, fall
+    # back to JSON `records`.
+    if request.headers.get("content-type", "").startswith("application/json"):
+        # JSON records arrive as the raw body because the endpoint also takes a file
+        raw = await request.body()
         try:
-            print('--- /cluster incoming request headers ---')
-            for k, v in request.headers.items():
-                print(f'{k}: {v}')
-        except Exception:
-            pass
+            df = await run_in_threadpool(_records_frame, raw)
+        except ValueError as e:
+            return None, None, JSONResponse({"error": "Invalid JSON body", "detail": str(e)}, status_code=400)
+        if df is None:
+            return None, None, JSONResponse({"error": "Provide CSV file, raw CSV body, or JSON records."}, status_code=400)
+        return None, df, None
+
+    upload, df, error = await _spool(request, None)
+    if error is not None:
+        return upload, df, error
+
+    if upload.size > 0:
+        return upload, None, None
+    if records is not None:
+        return None, await run_in_threadpool(pd.DataFrame, records), None
+    return None, None, JSONResponse({"error": "Provide CSV file, raw CSV body, or JSON records."}, status_code=400)
+
+
+def _records_frame(raw: bytes) -> pd.DataFrame | None:
+    """Frame from a JSON body holding a list of records or {"records": [...]}; None otherwise."""
+    body = json.loads(raw or b"null")
+    records = body.get("records") if isinstance(body, dict) else body
+    return pd.DataFrame(records) if isinstance(records, list) else None
+
+
+async def _spool(request: Request, file: UploadFile | None):
+    try:
+        return await spool_upload(iter_upload(request, file)), None, None
+    except UploadTooLarge as e:
+        return None, None, JSONResponse({"error": str(e)}, status_code=413)
+
+
+# ---------------- Batch Clustering ----------------
+# Default sections per group: cluster-level results only, so hundreds of
+# groups stay a small stream. Per-animal data is available via run_id.
+BATCH_FIELDS = "clusters,kpis,clustering"
+# Pause before resubmitting a group when the shared job queue is full
+BATCH_RETRY_SECONDS = float(os.environ.get("HERDV_BATCH_RETRY_SECONDS", "0.5"))
+
+
+async def _run_pooled(fn, *args, **kwargs):
+    """jobs.run that waits for room in the queue instead of failing with QueueFull."""
+    while True:
         try:
-            body = await request.body()
-        except Exception as e:
-            print('error reading body:', e)
-            body = b''
+            return await jobs.run(fn, *args, **kwargs)
+        except QueueFull:
+            await asyncio.sleep(BATCH_RETRY_SECONDS)
+
+
+def _split_batch_input(name: str | None, upload, df: pd.DataFrame | None, season: str | None,
+                       columns: list[str], several: bool) -> list[tuple[dict, pd.DataFrame]]:
+    """Parse one batch input (unless already a frame) and split it into (group key, rows)."""
+    if df is None:
+        df = read_csv(upload.source)
+    if season:
+        df = select_season(df, season)
+    by = columns or ([HERD_COL] if not several and HERD_COL in df.columns else [])
+    return [({"file": name, **key} if several else key, rows) for key, rows in split_groups(df, by)]
+
+
+def _store_batch_run(run: dict):
+    return _store_run(run), run
+
+
+async def _cluster_group(index: int, key: dict, df: pd.DataFrame, limit: asyncio.Semaphore,
+                         n_clusters: int, mode: str, selected: list[str], reduction: dict) -> dict:
+    """Cluster one group on the pool; failures become a "failed" line, never an exception."""
+    line = {"index": index, "group": key, "rows": len(df)}
+    try:
+        async with limit:
+            run_id, run = await _run_pooled(cluster_dataframe, df, n_clusters=n_clusters, mode=mode,
+                                            on_done=_store_batch_run, **reduction)
+        body = await run_in_threadpool(cluster_response, run_id, run, selected)
+        line.update(status="done", **body)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        line.update(status="failed", error=str(e))
+    return line
+
+
+@app.post("/cluster/batch")
+async def cluster_batch(
+    request: Request,
+    files: list[UploadFile] | None = File(None),
+    group_by: str | None = None,
+    season: str | None = None,
+    n_clusters: int = 4,
+    mode: str = "auto",
+    reduce: str = "none",
+    variance: float = REDUCE_VARIANCE,
+    projection_run_id: str | None = None,
+    fields: str = BATCH_FIELDS,
+):
+    """Cluster many herds (or herd-seasons) independently and stream the results.
+
+    Input is one CSV (multipart file or raw body) or several files. Each file
+    is split by the comma-separated `group_by` columns (e.g. Herd,Season). A
+    single CSV defaults to grouping by its Herd column; with several files and
+    no `group_by` every file is one group. `season` keeps
+    only that season's rows first. Groups run in parallel on the worker pool
+    and each result is written as one NDJSON line as soon as it finishes, in
+    completion order; a failing group yields a line with status "failed" and
+    the others carry on. A final line summarises the batch. `reduce`,
+    `variance` and `projection_run_id` apply to every group as in /cluster;
+    with `projection_run_id` all groups share one feature space.
+    """
+    error = _clustering_error(mode, n_clusters)
+    if error is not None:
+        return error
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    reduction, error = _reduction(reduce, variance, projection_run_id)
+    if error is not None:
+        return error
+    columns = [c.strip() for c in group_by.split(",") if c.strip()] if group_by else []
 
+    group_inputs = []
+    if files:
+        for file in files:
+            upload, _, error = await _spool(request, file)
+            if error is not None:
+                return error
+            group_inputs.append((file.filename, upload, None))
+    else:
+        upload, df, error = await _read_cluster_input(request, None, None)
+        if error is not None:
+            return error
+        group_inputs.append((None, upload, df))
+
+    groups = []
+    try:
+        for name, upload, df in group_inputs:
+            groups += await run_in_threadpool(_split_batch_input, name, upload, df, season, columns, bool(files))
+    except CSVParseError as e:
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        for _, upload, _ in group_inputs:
+            if upload is not None:
+                upload.close()
+    record(request, rows=sum(len(rows) for _, rows in groups))
+
+    async def stream():
+        limit = asyncio.Semaphore(jobs.max_workers)
+        tasks = [asyncio.ensure_future(_cluster_group(i, key, rows, limit, n_clusters, mode, selected,
+                                                     reduction))
+                 for i, (key, rows) in enumerate(groups)]
+        failed = 0
         try:
-            print('body length:', len(body))
-        except Exception:
-            pass
-
-        if body and len(body) > 0:
-            try:
-                df = _read_csv_bytes(body)
-            except Exception as e:
-                # If CSV parse failed, return the parse error for easier debugging
-                return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
-        elif records is not None:
-            df = pd.DataFrame(records)
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                failed += line["status"] == "failed"
+                yield await run_in_threadpool(encode_json, line) + b"\n"
+            yield encode_json({"summary": {"groups": len(groups), "done": len(groups) - failed,
+                                           "failed": failed}}) + b"\n"
+        finally:
+            # Client went away: stop groups that have not reached the pool yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
+# ---------------- Jobs ----------------
+@app.post("/jobs/cluster", status_code=202)
+async def submit_cluster_job(
+    request: Request,
+    file: UploadFile | None = File(None),
+    records: list[dict] | None = Body(None),
+    dataset_id: str | None = None,
+    n_clusters: int = 4,
+    season: str | None = None,
+    mode: str = "auto",
+    reduce: str = "none",
+    variance: float = REDUCE_VARIANCE,
+    projection_run_id: str | None = None,
+):
+    """Queue a clustering run on the worker pool and return its job_id right away."""
+    error = _clustering_error(mode, n_clusters)
+    if error is not None:
+        return error
+    reduction, error = _reduction(reduce, variance, projection_run_id)
+    if error is not None:
+        return error
+    upload, df, path = None, None, None
+    if dataset_id:
+        path = datasets.path(dataset_id)
+        if path is None:
+            return JSONResponse({"error": "Unknown or expired dataset_id."}, status_code=404)
+    else:
+        upload, df, error = await _read_cluster_input(request, file, records)
+        if error is not None:
+            return error
+    try:
+        if path is not None:
+            job_id = jobs.submit(cluster_dataset, path, n_clusters=n_clusters, mode=mode, season=season,
+                                 on_done=partial(_store_dataset_run, dataset_id), **reduction)
+        elif df is not None:
+            job_id = jobs.submit(cluster_dataframe, df, n_clusters=n_clusters, mode=mode, season=season,
+                                 on_done=_store_run, **reduction)
         else:
-            return JSONResponse({"error": "Provide CSV file, raw CSV body, or JSON records."}, status_code=400)
-
-    X, scaler, feature_names, df_clean = preprocess(df)
-    labels = run_ward(X, n_clusters=n_clusters)
-    df_labeled, means, counts = cluster_summary(df_clean, labels)
-    recs = cluster_recommendations(means)
-
-    linkage = ward(X)
-
-    global _last_linkage, _last_clusters, _last_means, _last_counts, _last_df
-    _last_linkage, _last_clusters, _last_means, _last_counts, _last_df = linkage, labels, means, counts, df_labeled
-
-    clusters = []
-    for _, m in means.iterrows():
-        cid = int(m["Cluster"])
-        clusters.append({
-            "cluster_id": cid,
-            "name": recs[cid]["name"],
-            "count": int(counts.loc[counts["Cluster"] == cid, "Count"].values[0]),
-            "means": {k: float(m[k]) for k in m.index if k != "Cluster"},
-            "recommendation": recs[cid]["recommendation"]
-        })
-
-    assignments = df_labeled[["ID","Cluster"]].rename(columns={"Cluster":"cluster_id"}).to_dict(orient="records")
-    kpis = herd_kpis(df_clean)
-    # include labeled full records so frontends can show per-animal features
-    labeled_records = df_labeled.to_dict(orient="records")
-
-    return {
-        "assignments": assignments,
-        "clusters": clusters,
-        "kpis": kpis,
-        "feature_names": feature_names,
-        "labeled_records": labeled_records,
+            # The worker reads the spooled file; it is removed once the job ends
+            job_id = jobs.submit(cluster_csv, upload.source, n_clusters=n_clusters, mode=mode, season=season,
+                                 on_done=_store_run, cleanup=upload.close, **reduction)
+    except QueueFull as e:
+        if upload is not None:
+            upload.close()
+        return JSONResponse({"error": str(e)}, status_code=429)
+    return jobs.status(job_id)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.status(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job_id."}, status_code=404)
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    request: Request,
+    job_id: str,
+    fields: str | None = None,
+    records_offset: int = 0,
+    records_limit: int | None = None,
+    layout: str = "rows",
+):
+    job = jobs.status(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job_id."}, status_code=404)
+    if job["status"] == "failed":
+        return JSONResponse({"error": "Job failed.", "detail": job["error"]}, status_code=500)
+    if job["status"] != "done":
+        return JSONResponse({"error": "Job not finished yet.", "status": job["status"],
+                             "progress": job["progress"]}, status_code=409)
+    return await get_run(request, jobs.result(job_id), fields, records_offset, records_limit, layout)
+
+
+# ---------------- Runs ----------------
+@app.get("/runs/{run_id}")
+async def get_run(
+    request: Request,
+    run_id: str,
+    fields: str | None = None,
+    records_offset: int = 0,
+    records_limit: int | None = None,
+    layout: str = "rows",
+):
+    """Return a stored run in the same shape (and with the same selectors) as /cluster."""
+    run, error = _get_run(run_id)
+    if error is not None:
+        return error
+    selected, error = _response_options(fields, layout, records_offset, records_limit)
+    if error is not None:
+        return error
+    timer = StageTimer()
+    with timer.stage("serialize"):
+        body = await run_in_threadpool(cluster_response, run_id, run, selected, records_offset, records_limit, layout)
+        response = await run_in_threadpool(render, body, request.headers.get("accept"))
+    record(request, timer.stages, rows=len(run["df"]))
+    return response
+
+
+@app.get("/runs/{run_id}/records")
+async def get_run_records(request: Request, run_id: str, offset: int = 0, limit: int = 1000,
+                          layout: str = "columns"):
+    """Page through a run's labeled per-animal records.
+
+    Returns {"offset", "limit", "total", "records"}; with
+    `Accept: application/vnd.apache.arrow.stream` the page is sent as an
+    Arrow IPC stream instead (total in the X-Total-Count header).
+    """
+    run, error = _get_run(run_id)
+    if error is not None:
+        return error
+    error = _layout_error(layout)
+    if error is not None:
+        return error
+    try:
+        page = records_page(run["df"], offset, limit)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    total = len(run["df"])
+    accept = request.headers.get("accept")
+    if wants(accept, [ARROW_MEDIA_TYPE]):
+        response = await run_in_threadpool(arrow_response, page)
+        response.headers["X-Total-Count"] = str(total)
+        return response
+    records = await run_in_threadpool(frame_payload, page, layout)
+    return await run_in_threadpool(render, {"offset": offset, "limit": limit, "total": total, "records": records}, accept)
+
+@app.post("/runs/{run_id}/assign")
+async def assign_to_run(
+    request: Request,
+    run_id: str,
+    file: UploadFile | None = File(None),
+    records: list[dict] | None = Body(None),
+    layout: str = "rows",
+):
+    """Assign new or re-measured animals to the clusters of an existing run.
+
+    Accepts the same inputs as /cluster (CSV file, raw CSV body or JSON
+    records). Each animal goes to the nearest cluster centroid using the
+    run's fitted scaler and Breed categories, so cluster IDs never change;
+    breeds the run has not seen are encoded as all zeros and flagged.
+    """
+    run, error = _get_run(run_id)
+    if error is not None:
+        return error
+    error = _layout_error(layout)
+    if error is not None:
+        return error
+    assigner = run.get("assigner")
+    if assigner is None:
+        return JSONResponse({"error": "Run has no fitted model; cluster the herd again."}, status_code=409)
+
+    upload, df, error = await _read_cluster_input(request, file, records)
+    if error is not None:
+        return error
+    timer = StageTimer()
+    try:
+        if df is None:
+            with timer.stage("parse"):
+                df = await run_in_threadpool(read_csv, upload.source)
+        with timer.stage("assign"):
+            assigned = await run_in_threadpool(assigner.assign, df)
+    except CSVParseError as e:
+        return JSONResponse({"error": "Failed to parse CSV body", "detail": str(e)}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        if upload is not None:
+            upload.close()
+    names = {c["cluster_id"]: c["name"] for c in run["summary"]["clusters"]}
+    assigned.insert(2, "cluster_name", assigned["cluster_id"].map(names))
+    with timer.stage("serialize"):
+        body = {"run_id": run_id, "count": len(assigned), "assignments": frame_payload(assigned, layout)}
+        response = await run_in_threadpool(render, body, request.headers.get("accept"))
+    record(request, timer.stages, rows=len(assigned))
+    return response
+
+# ---------------- Alerts ----------------
+def _herd_alerts(df_labeled: pd.DataFrame, rules: list[dict], flagged_only: bool):
+    """Per-animal rule flags for a labeled herd plus their per-cluster rollup."""
+    flags = evaluate_rules(df_labeled, rules=rules)
+    rollup = cluster_rollup(flags, df_labeled["Cluster"]).rename(columns={"Cluster": "cluster_id", "Count": "count"})
+    animals = pd.concat([df_labeled[["ID", "Cluster"]].rename(columns={"Cluster": "cluster_id"}), flags], axis=1)
+    if flagged_only:
+        animals = animals[flags.to_numpy().any(axis=1)]
+    return animals, rollup
+
+
+@app.get("/runs/{run_id}/alerts")
+async def get_run_alerts(
+    request: Request,
+    run_id: str,
+    rules: str | None = None,
+    flagged_only: bool = True,
+    offset: int = 0,
+    limit: int = 1000,
+    layout: str = "rows",
+):
+    """Evaluate the recommendation rules for every animal of a run.
+
+    rules: comma-separated rule keys (default: all). Thresholds relative to
+    the herd (mean/median) use the whole run's animals. Returns the rule
+    table, per-cluster counts and shares of flagged animals, and a page of
+    per-animal flags (only animals with at least one flag by default).
+    """
+    run, error = _get_run(run_id)
+    if error is not None:
+        return error
+    error = _layout_error(layout)
+    if error is not None:
+        return error
+    by_key = {r["key"]: r for r in RULES}
+    keys = [k.strip() for k in rules.split(",") if k.strip()] if rules else list(by_key)
+    unknown = [k for k in keys if k not in by_key]
+    if unknown or not keys:
+        return JSONResponse({"error": f"Unknown rules: {unknown}. Use any of: {', '.join(by_key)}."}, status_code=400)
+    selected = [by_key[k] for k in keys]
+
+    timer = StageTimer()
+    with timer.stage("rules"):
+        animals, rollup = await run_in_threadpool(_herd_alerts, run["df"], selected, flagged_only)
+    try:
+        page = records_page(animals, offset, limit)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    body = {
+        "run_id": run.get("run_id", run_id),
+        "rules": [{"key": r["key"], "label": r["label"], "action": r["action"]} for r in selected],
+        "clusters": frame_payload(rollup, "rows"),
+        "offset": offset,
+        "limit": limit,
+        "total": len(animals),
     }
+    with timer.stage("serialize"):
+        body["animals"] = await run_in_threadpool(frame_payload, page, layout)
+        response = await run_in_threadpool(render, body, request.headers.get("accept"))
+    record(request, timer.stages, rows=len(run["df"]))
+    return response
 
 # ---------------- Dendrogram ----------------
 @app.get("/dendrogram")
-async def get_dendrogram():
-    if _last_linkage is None:
-        return JSONResponse({"error": "No clustering run yet."}, status_code=400)
-    fig = plt.figure(figsize=(10, 6))
-    dendrogram(_last_linkage, no_labels=True)
-    plt.tight_layout()
-    buf = BytesIO()
-    fig.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    return Response(content=buf.getvalue(), media_type="image/png")
+async def get_dendrogram(
+    request: Request,
+    run_id: str | None = None,
+    dataset_id: str | None = None,
+    format: str = "png",
+    truncate_mode: str = "auto",
+    p: int | None = None,
+):
+    """Dendrogram of a run's Ward tree as a PNG or as JSON merge coordinates.
+
+    truncate_mode: 'auto' (full tree up to 500 leaves, else the last 100
+    merges), 'none', 'lastp' (show the last p merges) or 'level' (p levels
+    deep). Results are cached per run and parameters.
+    """
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    if format not in ("png", "json"):
+        return JSONResponse({"error": "Invalid format. Use png or json."}, status_code=400)
+    tag, not_modified = _not_modified(request, run)
+    if not_modified is not None:
+        return not_modified
+    key = f"{run['run_id']}:dendrogram:{format}:{truncate_mode}:{p}"
+    cached = renders.get(key)
+    if cached is None:
+        render_fn = dendrogram_png if format == "png" else dendrogram_coords
+        timer = StageTimer()
+        try:
+            with timer.stage("render"):
+                content = await run_in_threadpool(render_fn, run["tree"].linkage, truncate_mode, p)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        record(request, timer.stages)
+        cached = {"content": content}
+        renders.put(cached, key)
+    if format == "json":
+        response = render(cached["content"])
+    else:
+        response = Response(content=cached["content"], media_type="image/png")
+    response.headers["ETag"] = tag
+    return response
 
 
 @app.get("/cluster/compare")
-async def compare_clusterings(ks: str = "3,4,5"):
-    """Run clustering for multiple k values on the last dataset and return counts and ARI matrix.
+async def compare_clusterings(ks: str = "3,4,5", run_id: str | None = None, dataset_id: str | None = None):
+    """Cut a run's Ward tree at multiple k values and return counts and ARI matrix.
 
     ks: comma-separated list of integers, e.g. '3,4,5'
     """
-    if _last_df is None:
-        return JSONResponse({"error": "No clustering run yet."}, status_code=400)
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
     try:
         ks_list = [int(k) for k in ks.split(",") if k.strip()]
     except Exception:
         return JSONResponse({"error": "Invalid ks parameter."}, status_code=400)
+    for k in ks_list:
+        error = _cluster_count_error(k, "ks", leaves=run["tree"].n_leaves)
+        if error is not None:
+            return error
 
-    # Prepare features using the same preprocess pipeline (drop any existing Cluster column)
-    df_src = _last_df.copy()
-    if "Cluster" in df_src.columns:
-        df_src = df_src.drop(columns=["Cluster"])
-    X, scaler, feature_names, df_clean = preprocess(df_src)
+    # No re-preprocessing or re-fitting: every k is a cut of the stored tree
+    counts, ari = await run_in_threadpool(compare_cuts, run["tree"], ks_list)
+    return {"ks": ks_list, "counts": counts, "ari": ari}
 
-    labels_map = {}
-    results = {}
-    for k in ks_list:
-        labels = run_ward(X, n_clusters=k)
-        unique, counts = np.unique(labels, return_counts=True)
-        results[k] = {int(u): int(c) for u, c in zip(unique, counts)}
-        labels_map[k] = labels
-
-    # Pairwise ARI
-    ari = {}
-    for i in ks_list:
-        row = {}
-        for j in ks_list:
-            if i == j:
-                row[j] = 1.0
-            else:
-                row[j] = float(adjusted_rand_score(labels_map[i], labels_map[j]))
-        ari[i] = row
 
-    return {"ks": ks_list, "counts": results, "ari": ari}
+@app.get("/cluster/auto-k")
+async def auto_k(
+    request: Request,
+    k_min: int = 2,
+    k_max: int = 10,
+    run_id: str | None = None,
+    dataset_id: str | None = None,
+    sample_size: int = SILHOUETTE_SAMPLE,
+    time_budget: float = AUTO_K_BUDGET_SECONDS,
+):
+    """Score cuts k_min..k_max of a run's Ward tree and recommend a k.
+
+    Returns silhouette (on a stratified sample of `sample_size` rows),
+    Calinski–Harabasz and Davies–Bouldin per k, the best k for each metric
+    and an overall recommendation. Scoring stops once `time_budget` seconds
+    are used up; `complete` tells whether every k was scored.
+    """
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    if not 2 <= k_min <= k_max:
+        return JSONResponse({"error": "Need 2 <= k_min <= k_max."}, status_code=400)
+    if sample_size < 10 or time_budget <= 0:
+        return JSONResponse({"error": "sample_size must be at least 10 and time_budget positive."}, status_code=400)
+    timer = StageTimer()
+    with timer.stage("features"):
+        X = await run_in_threadpool(run_matrix, run)
+    with timer.stage("score"):
+        result = await run_in_threadpool(score_cuts, run["tree"], X, list(range(k_min, k_max + 1)),
+                                         sample_size, time_budget)
+    record(request, timer.stages, rows=len(X))
+    return {"run_id": run["run_id"], **result}
 
 
 # ---------------- Boxplots / Plots ----------------
+async def _distributions(run: dict, bins: int = HISTOGRAM_BINS, max_outliers: int = MAX_OUTLIERS) -> dict:
+    """Per-cluster distribution statistics of every NUMERIC feature, computed once per run."""
+    key = f"{run['run_id']}:distributions:{bins}:{max_outliers}"
+    cached = renders.get(key)
+    if cached is None:
+        cached = await run_in_threadpool(cluster_distributions, run["df"], None, bins, max_outliers)
+        renders.put(cached, key)
+    return cached
+
+
+async def _distribution_png(run: dict, features: list[str], ncols: int = 4, titles: dict | None = None) -> bytes:
+    key = f"{run['run_id']}:distribution_png:{','.join(features)}:{ncols}:{titles}"
+    cached = renders.get(key)
+    if cached is None:
+        dist = await _distributions(run)
+        cached = {"content": await run_in_threadpool(distribution_grid_png, dist, features, ncols, 3.2, 2.6,
+                                                     titles)}
+        renders.put(cached, key)
+    return cached["content"]
+
+
+@app.get("/plots/distributions")
+async def plot_distributions(
+    request: Request,
+    run_id: str | None = None,
+    dataset_id: str | None = None,
+    features: str | None = None,
+    format: str = "json",
+    bins: int = HISTOGRAM_BINS,
+    max_outliers: int = MAX_OUTLIERS,
+):
+    """Per-cluster quartiles, whiskers, outliers, means and histograms for NUMERIC features.
+
+    JSON (default) is columnar per feature, one entry per cluster in the
+    order of `clusters`, for clients to draw; at most `max_outliers` of the
+    most extreme outliers are listed, `outlier_count` has the total.
+    format=png renders boxplots of the selected features as one grid image.
+    Statistics are computed once per run and cached.
+    """
+    if format not in ("json", "png"):
+        return JSONResponse({"error": "Invalid format. Use json or png."}, status_code=400)
+    if not 1 <= bins <= 200 or max_outliers < 0:
+        return JSONResponse({"error": "bins must be 1..200 and max_outliers not negative."}, status_code=400)
+    selected = NUMERIC if not features else [f.strip() for f in features.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in NUMERIC]
+    if unknown:
+        return JSONResponse({"error": f"Unknown features: {unknown}. Use any of: {', '.join(NUMERIC)}."},
+                            status_code=400)
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    tag, not_modified = _not_modified(request, run)
+    if not_modified is not None:
+        return not_modified
+    timer = StageTimer()
+    if format == "png":
+        with timer.stage("render"):
+            content = await _distribution_png(run, selected)
+        response = Response(content=content, media_type="image/png")
+    else:
+        with timer.stage("stats"):
+            dist = await _distributions(run, bins, max_outliers)
+        body = {**dist, "features": {f: dist["features"][f] for f in selected}}
+        response = render({"run_id": run["run_id"], **body}, request.headers.get("accept"))
+    record(request, timer.stages, rows=len(run["df"]))
+    response.headers["ETag"] = tag
+    return response
+
+
 @app.get("/plots/boxplot/milk_yield")
-async def boxplot_milk_yield():
-    if _last_df is None:
-        return JSONResponse({"error": "No clustering run yet."}, status_code=400)
-    fig, ax = plt.subplots(figsize=(6, 4))
-    try:
-        # Use pandas boxplot grouped by Cluster
-        _last_df.boxplot(column="Milk_Yield", by="Cluster", ax=ax)
-        plt.title("Milk Yield by Cluster")
-        plt.suptitle("")
-        plt.tight_layout()
-        buf = BytesIO()
-        fig.savefig(buf, format="png", bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        return Response(content=buf.getvalue(), media_type="image/png")
-    finally:
-        try:
-            plt.close(fig)
-        except Exception:
-            pass
+async def boxplot_milk_yield(request: Request, run_id: str | None = None, dataset_id: str | None = None):
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    tag, not_modified = _not_modified(request, run)
+    if not_modified is not None:
+        return not_modified
+    # Drawn from the run's cached distribution statistics, like /plots/distributions
+    content = await _distribution_png(run, ["Milk_Yield"], ncols=1, titles={"Milk_Yield": "Milk Yield by Cluster"})
+    return Response(content=content, media_type="image/png", headers={"ETag": tag})
 
 
 # ---------------- Export Assignments ----------------
 @app.get("/export/assignments")
-async def export_assignments():
-    if _last_df is None:
-        return JSONResponse({"error": "No clustering run yet."}, status_code=400)
-
-    rows = _last_df[["ID", "Cluster"]].rename(columns={"Cluster": "cluster_id"}).to_dict(orient="records")
-    # Write CSV to a text buffer then encode
-    s = StringIO()
-    writer = csv.DictWriter(s, fieldnames=["ID", "cluster_id"])
-    writer.writeheader()
-    writer.writerows(rows)
-    data = s.getvalue().encode("utf-8")
-    return Response(content=data, media_type="text/csv",
-                    headers={"Content-Disposition": "attachment; filename=assignments.csv"})
-
+async def export_assignments(request: Request, run_id: str | None = None, dataset_id: str | None = None):
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    tag, not_modified = _not_modified(request, run)
+    if not_modified is not None:
+        return not_modified
+    return StreamingResponse(iter_csv(assignments_frame(run["df"])), media_type="text/csv",
+                             headers={"Content-Disposition": "attachment; filename=assignments.csv", "ETag": tag})
 
- 
 
 # ---------------- Export Recommendations ----------------
 @app.post("/recommendations/export")
-async def export_recommendations(format: str = Body("csv")):
-    if _last_means is None:
-        return JSONResponse({"error": "No clustering run yet."}, status_code=400)
-
-    recs = cluster_recommendations(_last_means)
-    rows = []
-    for _, m in _last_means.iterrows():
-        cid = int(m["Cluster"])
-        row = {"Cluster": cid, "Name": recs[cid]["name"], "Recommendation": recs[cid]["recommendation"]}
-        for k in m.index:
-            if k != "Cluster":
-                row[k] = float(m[k])
-        rows.append(row)
+async def export_recommendations(format: str = Body("csv"), run_id: str | None = None,
+                                 dataset_id: str | None = None, plots: bool = False):
+    """Cluster recommendations as CSV or PDF; with plots=true the PDF ends with a
+    page of per-cluster boxplots for every NUMERIC feature."""
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
 
+    means = run["means"]
+    rows = recommendations_frame(means, cluster_recommendations(means))
     if format.lower() == "csv":
-        output = BytesIO()
-        writer = csv.DictWriter(output, fieldnames=list(rows[0].keys()))
-        writer.writeheader()
-        writer.writerows(rows)
-        output.seek(0)
-        return Response(content=output.getvalue(), media_type="text/csv",
-                        headers={"Content-Disposition": "attachment; filename=cluster_recommendations.csv"})
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    c = canvas.Canvas(tmp.name, pagesize=letter)
-    width, height = letter
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "HERD-V Cluster Recommendations")
-    y -= 30
-    c.setFont("Helvetica", 10)
-    for r in rows:
-        text = f"Cluster {r['Cluster']} - {r['Name']}: {r['Recommendation']}"
-        c.drawString(50, y, text)
-        y -= 14
-        if y < 80:
-            c.showPage()
-            y = height - 50
-    c.save()
-    with open(tmp.name, "rb") as f:
-        pdf_bytes = f.read()
-    os.unlink(tmp.name)
+        return StreamingResponse(iter_csv(rows), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=cluster_recommendations.csv"})
+    images = [await _distribution_png(run, NUMERIC, ncols=3)] if plots else None
+    pdf_bytes = await run_in_threadpool(recommendations_pdf, rows, images)
     return Response(content=pdf_bytes, media_type="application/pdf",
                     headers={"Content-Disposition": "attachment; filename=cluster_recommendations.pdf"})
+
+
+# ---------------- Per-Animal Report ----------------
+@app.get("/export/report")
+async def export_report(request: Request, format: str = "csv", run_id: str | None = None,
+                        dataset_id: str | None = None, clusters: str | None = None):
+    """Per-cluster, per-animal report streamed as CSV chunks or PDF pages.
+
+    `clusters` is an optional comma-separated list of cluster IDs to include.
+    """
+    fmt = format.lower()
+    if fmt not in REPORT_FORMATS:
+        return JSONResponse({"error": f"format must be one of: {', '.join(REPORT_FORMATS)}."}, status_code=400)
+    try:
+        selected = None if not clusters else [int(c) for c in clusters.split(",") if c.strip()]
+    except ValueError:
+        return JSONResponse({"error": "clusters must be a comma-separated list of cluster IDs."}, status_code=400)
+    run, error = await _resolve_run(run_id, dataset_id)
+    if error is not None:
+        return error
+    tag, not_modified = _not_modified(request, run)
+    if not_modified is not None:
+        return not_modified
+
+    recs = cluster_recommendations(run["means"])
+    names = {cid: r["name"] for cid, r in recs.items()}
+    if fmt == "csv":
+        body = iter_report_csv(run["df"], names, selected)
+        media_type = "text/csv"
+    else:
+        body = iter_report_pdf(run["df"], names, {cid: r["recommendation"] for cid, r in recs.items()}, selected)
+        media_type = "application/pdf"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=herd_report.{fmt}", "ETag": tag})
+
+
+# ---------------- Metrics ----------------
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the request, pipeline-stage, cache and job metrics."""
+    if not METRICS_ENABLED:
+        return JSONResponse({"error": "Metrics are disabled (HERDV_METRICS=0)."}, status_code=404)
+    # store sizes and the job backlog are sampled at scrape time
+    for name, store in (("result", results), ("render", renders), ("input", inputs), ("response", responses)):
+        stats = store.stats()
+        CACHE_ENTRIES.set(name, value=stats["entries"])
+        CACHE_BYTES.set(name, value=stats["bytes"])
+    stats = jobs.stats()
+    JOBS_ACTIVE.set(value=stats["active"])
+    JOBS_CAPACITY.set(value=stats["workers"] + stats["queue_depth"])
+    return Response(content=expose(), media_type=PROMETHEUS_MEDIA_TYPE)
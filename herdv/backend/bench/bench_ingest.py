@@ -0,0 +1,100 @@
+# backend/bench/bench_ingest.py
+"""Benchmark CSV ingestion + coerce_types against the original implementation.
+
+Run from the herdv/ directory:
+
+    python -m backend.bench.bench_ingest --rows 200000
+
+Builds a dirty synthetic herd with backend.bench.synth (the same generator
+bench_pipeline uses), checks that the fast path produces exactly the same
+frame as the original one (also with a short row and a blank line in the
+CSV), and prints timings for both. The read is also timed with each parser
+engine forced, since which one read_csv_bytes picks depends on the host
+(pyarrow only wins with more than one CPU).
+"""
+import argparse
+import os
+import time
+from io import BytesIO
+
+import pandas as pd
+
+from backend.bench.synth import make_herd_csv
+from backend.models.preprocess import coerce_types
+from backend.utils.ingest import HAVE_PYARROW, USE_PYARROW, read_csv_bytes
+from backend.utils.schema import BOOLEAN, CATEGORICAL, ID_COL, NUMERIC
+
+
+def legacy_read_csv_bytes(content: bytes) -> pd.DataFrame:
+    df = pd.read_csv(BytesIO(content), skipinitialspace=True)
+    df.columns = [str(c).strip() for c in df.columns]
+    for col in df.select_dtypes(include=[object]).columns:
+        df[col] = df[col].astype(str).str.strip()
+    return df
+
+
+def legacy_coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df[ID_COL] = df[ID_COL].astype(str)
+    for col in CATEGORICAL:
+        df[col] = df[col].astype(str)
+    for col in BOOLEAN:
+        df[col] = df[col].map(
+            lambda x: 1 if str(x).strip().lower() in ["1","true","yes","y","t"] else 0
+        ).astype(int)
+    for col in NUMERIC:
+        df[col] = df[col].astype(str).str.strip().str.replace(r"\s+", "", regex=True).str.replace(',', '')
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def edge_cases(content: bytes) -> dict[str, bytes]:
+    """Variants the pyarrow engine rejects and the C parser accepts: a row
+    missing its last field and a whitespace-only line."""
+    lines = content.split(b"\n")
+    mid = len(lines) // 2
+    return {
+        "short_row": b"\n".join(lines[:mid] + [lines[mid].rsplit(b",", 1)[0]] + lines[mid + 1:]),
+        "blank_line": b"\n".join(lines[:mid] + [b"   "] + lines[mid:]),
+    }
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dirty-frac", type=float, default=0.02, help="share of messy cells per column")
+    parser.add_argument("--missing-frac", type=float, default=0.01, help="share of empty numeric cells")
+    args = parser.parse_args()
+
+    content = make_herd_csv(args.rows, dirty_frac=args.dirty_frac, missing_frac=args.missing_frac)
+    t_old_read, old = timed(legacy_read_csv_bytes, content)
+    t_old_coerce, old = timed(legacy_coerce_types, old)
+    t_new_read, new = timed(read_csv_bytes, content)
+    t_new_coerce, new = timed(coerce_types, new)
+    pd.testing.assert_frame_equal(old, new)
+    for variant in edge_cases(content).values():
+        pd.testing.assert_frame_equal(legacy_coerce_types(legacy_read_csv_bytes(variant)),
+                                      coerce_types(read_csv_bytes(variant)))
+
+    print(f"rows={args.rows} bytes={len(content)} cpus={os.cpu_count()} pyarrow={HAVE_PYARROW} "
+          f"engine={'pyarrow' if USE_PYARROW else 'c'} (results identical)")
+    print(f"{'stage':<14}{'legacy s':>10}{'fast s':>10}{'speedup':>9}")
+    for stage, a, b in [("read", t_old_read, t_new_read), ("coerce_types", t_old_coerce, t_new_coerce),
+                        ("total", t_old_read + t_old_coerce, t_new_read + t_new_coerce)]:
+        print(f"{stage:<14}{a:>10.3f}{b:>10.3f}{a / b:>8.1f}x")
+    for engine in ("c", "pyarrow") if HAVE_PYARROW else ("c",):
+        t, _ = timed(read_csv_bytes, content, engine)
+        print(f"{'read ' + engine:<14}{'':>10}{t:>10.3f}{t_old_read / t:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
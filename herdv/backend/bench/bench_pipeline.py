@@ -0,0 +1,204 @@
+# backend/bench/bench_pipeline.py
+"""Time every stage of the clustering pipeline on synthetic herds.
+
+Run from the herdv/ directory:
+
+    python -m backend.bench.bench_pipeline --sizes 1000,10000,100000 --out base.json
+    # ... change code, then
+    python -m backend.bench.bench_pipeline --sizes 1000,10000,100000 --compare base.json
+
+Each stage is timed separately (best of --repeat) on a herd from
+backend.bench.synth and the results are written as JSON together with the
+commit and library versions. `--compare BASE [NEW]` prints per-stage ratios
+against a saved run (comparing two saved files when NEW is given) and exits
+with status 1 when any stage got slower than the tolerance allows.
+`--reduce pca|randomized --variance 0.9` adds the reduction stage ahead of
+the tree and records how closely its clusters match the full-width ones.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backend.bench.synth import make_herd_csv
+from backend.models.cluster import WardTree, cluster_summary
+from backend.models.preprocess import fit_preprocess, matrix_info
+from backend.models.reduce import REDUCE_METHODS, REDUCE_VARIANCE, Projection
+from backend.models.recommend import cluster_recommendations, evaluate_rules
+from backend.utils.ingest import HAVE_PYARROW, read_csv_bytes
+from backend.utils.plots import dendrogram_png
+from backend.utils.responses import SECTIONS, cluster_response, encode_json
+
+# Stage timings below this many seconds are noise and never count as regressions
+NOISE_FLOOR = 0.02
+
+
+def _timed(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def bench_size(rows: int, n_clusters: int = 4, repeat: int = 3, seed: int = 0, reduce: str = "none",
+               variance: float = REDUCE_VARIANCE) -> tuple[list[dict], dict]:
+    """Time each stage on one synthetic herd; returns (stage results, herd info).
+
+    With `reduce`, a "reduce" stage projects the feature matrix before the
+    tree is built and the herd info gets the reduction and the ARI of its
+    labels against the full-width tree's.
+    """
+    content = make_herd_csv(rows, seed=seed, dirty_frac=0.01, missing_frac=0.005)
+    results = []
+
+    def stage(name, fn, n=repeat):
+        seconds, out = _timed(fn, n)
+        results.append({"rows": rows, "stage": name, "seconds": seconds})
+        return out
+
+    df = stage("read_csv_bytes", lambda: read_csv_bytes(content))
+    X, encoder, df_clean = stage("preprocess", lambda: fit_preprocess(df))
+    reduction = {}
+    if reduce != "none":
+        from sklearn.metrics import adjusted_rand_score
+
+        full = WardTree(X).cut(n_clusters)
+        projection = stage("reduce", lambda: Projection(reduce, variance).fit(X))
+        X = projection.transform(X)
+        reduction = {"reduction": projection.info()}
+    # Building the tree dominates; more than one pass at 100k rows is slow
+    tree = stage("linkage", lambda: WardTree(X), n=1 if rows > 20_000 else repeat)
+
+    def cut():
+        tree._cuts.clear()  # time the cut itself, not the cached lookup
+        return tree.cut(n_clusters)
+
+    labels = stage("cut", cut)
+    if reduction:
+        reduction["ari_vs_full"] = float(adjusted_rand_score(full, labels))
+    df_labeled, means, counts = stage("cluster_summary", lambda: cluster_summary(df_clean, labels))
+    recs = stage("cluster_recommendations", lambda: cluster_recommendations(means))
+    stage("rule_alerts", lambda: evaluate_rules(df_labeled))
+
+    clusters = [{"cluster_id": int(m["Cluster"]), "name": recs[int(m["Cluster"])]["name"],
+                 "count": int(c), "means": {k: float(m[k]) for k in m.index if k != "Cluster"},
+                 "recommendation": recs[int(m["Cluster"])]["recommendation"]}
+                for (_, m), c in zip(means.iterrows(), counts["Count"])]
+    run = {"df": df_labeled, "summary": {"clusters": clusters, "kpis": {}, "feature_names": encoder.feature_names,
+                                         "clustering": tree.info()}}
+    stage("serialize_json", lambda: encode_json(cluster_response("bench", run, SECTIONS)))
+    stage("dendrogram_png", lambda: dendrogram_png(tree.linkage))
+    return results, {"rows": rows, "bytes": len(content), **tree.info(), "feature_matrix": matrix_info(X),
+                     **reduction}
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: list[int], n_clusters: int = 4, repeat: int = 3, reduce: str = "none",
+              variance: float = REDUCE_VARIANCE) -> dict:
+    results, herds = [], []
+    for rows in sizes:
+        stages, info = bench_size(rows, n_clusters=n_clusters, repeat=repeat, reduce=reduce, variance=variance)
+        results.extend(stages)
+        herds.append(info)
+        print(f"rows={rows:<8} " + " ".join(f"{r['stage']}={r['seconds']:.3f}" for r in stages), file=sys.stderr)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "pyarrow": HAVE_PYARROW,
+            "repeat": repeat,
+            "n_clusters": n_clusters,
+            "reduce": reduce,
+            "variance": variance,
+        },
+        "herds": herds,
+        "results": results,
+    }
+
+
+def compare(base: dict, new: dict, tolerance: float = 0.25) -> list[dict]:
+    """Per (rows, stage) ratio new/base; `regression` marks slowdowns beyond tolerance."""
+    before = {(r["rows"], r["stage"]): r["seconds"] for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        old = before.get((r["rows"], r["stage"]))
+        if old is None:
+            continue
+        ratio = r["seconds"] / old if old > 0 else float("inf")
+        regression = ratio > 1 + tolerance and r["seconds"] - old > NOISE_FLOOR
+        rows.append({"rows": r["rows"], "stage": r["stage"], "base": old, "new": r["seconds"],
+                     "ratio": ratio, "regression": regression})
+    return rows
+
+
+def print_table(results: list[dict]):
+    print(f"{'rows':>8}  {'stage':<26}{'seconds':>10}")
+    for r in results:
+        print(f"{r['rows']:>8}  {r['stage']:<26}{r['seconds']:>10.4f}")
+
+
+def print_comparison(rows: list[dict]):
+    print(f"{'rows':>8}  {'stage':<26}{'base s':>10}{'new s':>10}{'ratio':>8}")
+    for r in rows:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['rows']:>8}  {r['stage']:<26}{r['base']:>10.4f}{r['new']:>10.4f}{r['ratio']:>7.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated herd sizes")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reduce", choices=REDUCE_METHODS, default="none",
+                        help="project the feature matrix before Ward (reports ARI against the full width)")
+    parser.add_argument("--variance", type=float, default=REDUCE_VARIANCE, help="variance target for --reduce")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    parser.add_argument("--compare", nargs="+", metavar="FILE",
+                        help="BASE [NEW]: compare against a saved run (or compare two saved runs)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes BASE or BASE NEW")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1]) as f:
+            suite = json.load(f)
+    else:
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+        suite = run_suite(sizes, n_clusters=args.clusters, repeat=args.repeat, reduce=args.reduce,
+                          variance=args.variance)
+        print_table(suite["results"])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(suite, f, indent=2)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        rows = compare(base, suite, args.tolerance)
+        print_comparison(rows)
+        if any(r["regression"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# backend/bench/bench_startup.py
+"""Benchmark backend cold start: lazy imports versus importing everything up front.
+
+Run from the herdv/ directory:
+
+    python -m backend.bench.bench_startup --repeat 5
+
+Each sample imports `backend.app` in a fresh interpreter, once as shipped and
+once with HERDV_EAGER_IMPORTS=1 (the old behaviour), and reports the best and
+median wall time together with the first-request cost of the lazy modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import backend.app
+imported = time.perf_counter() - t
+from backend.utils.warmup import HEAVY_MODULES, warm_up
+lazy = [m for m in HEAVY_MODULES if m not in sys.modules]
+t = time.perf_counter()
+warm_up(lazy)
+print(json.dumps({"import": imported, "warm_up": time.perf_counter() - t, "lazy": len(lazy)}))
+"""
+
+
+def sample(eager: bool) -> dict:
+    env = dict(os.environ, HERDV_EAGER_IMPORTS="1" if eager else "0", HERDV_WARMUP="0")
+    out = subprocess.run([sys.executable, "-c", _PROBE], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'best s':>9}{'median s':>10}{'deferred s':>12}{'lazy mods':>11}")
+    for name, eager in [("eager", True), ("lazy", False)]:
+        runs = [sample(eager) for _ in range(args.repeat)]
+        times = [r["import"] for r in runs]
+        deferred = statistics.median(r["warm_up"] for r in runs)
+        print(f"{name:<8}{min(times):>9.3f}{statistics.median(times):>10.3f}"
+              f"{deferred:>12.3f}{runs[0]['lazy']:>11}")
+
+
+if __name__ == "__main__":
+    main()
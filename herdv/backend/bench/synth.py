@@ -0,0 +1,143 @@
+# backend/bench/synth.py
+"""Synthetic herds that follow backend/utils/schema.py.
+
+Run from the herdv/ directory to write a CSV:
+
+    python -m backend.bench.synth --rows 100000 --dirty 0.02 --missing 0.01 -o herd.csv
+
+Animals get a breed from a weighted mix (dairy breeds give milk, beef breeds
+carry weight) and a health state (healthy, heat-stressed or parasitised)
+that shifts the relevant measurements, so clustering finds real structure.
+Optionally a fraction of numeric cells is written the way field exports
+mangle them (thousands separators, stray spaces) or left empty.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backend.utils.schema import BOOLEAN, CATEGORICAL, ID_COL, NUMERIC, REQUIRED_COLUMNS
+
+# Share of each breed in the herd
+BREED_MIX = {
+    "Holstein": 0.30, "Jersey": 0.12, "Guernsey": 0.05, "Angus": 0.15, "Hereford": 0.10,
+    "Simmental": 0.08, "Charolais": 0.07, "Limousin": 0.07, "Brahman": 0.06,
+}
+# (Weight_kg, Milk_Yield) means per breed
+BREED_PROFILES = {
+    "Holstein": (650, 29.0), "Jersey": (480, 25.0), "Guernsey": (530, 27.0),
+    "Angus": (680, 11.0), "Hereford": (700, 10.5), "Simmental": (690, 13.0),
+    "Charolais": (720, 10.0), "Limousin": (640, 12.5), "Brahman": (700, 14.5),
+}
+# Herd-wide (mean, std) of the remaining numeric features
+BASELINE = {
+    "Age": (4.3, 1.5), "Weight_kg": (0.0, 45.0), "Milk_Yield": (0.0, 2.5), "Fertility_Score": (7.2, 0.8),
+    "Rumination_Minutes_Per_Day": (450, 30), "Ear_Temperature_C": (38.5, 0.2),
+    "Parasite_Load_Index": (45, 8), "Fecal_Egg_Count": (900, 90), "Respiration_Rate_BPM": (28, 2),
+    "Forage_Quality_Index": (83, 6), "Movement_Score": (6.7, 0.5), "Remaining_Months": (44, 8),
+}
+# Health states: share of the herd and the shift they add to each feature
+HEALTH_STATES = {
+    "healthy": (0.80, {}),
+    "heat_stress": (0.07, {"Ear_Temperature_C": 1.6, "Respiration_Rate_BPM": 12, "Rumination_Minutes_Per_Day": -60,
+                           "Milk_Yield": -4, "Movement_Score": -0.8}),
+    "parasitised": (0.13, {"Parasite_Load_Index": 25, "Fecal_Egg_Count": 450, "Weight_kg": -40,
+                           "Fertility_Score": -1.2, "Forage_Quality_Index": -8}),
+}
+DECIMALS = {"Age": 0, "Rumination_Minutes_Per_Day": 0, "Parasite_Load_Index": 0, "Fecal_Egg_Count": 0,
+            "Respiration_Rate_BPM": 0, "Forage_Quality_Index": 0, "Remaining_Months": 0}
+BOOLEAN_SPELLINGS = (["1", "yes", "Y", "true", "t"], ["0", "no", "N", "false", "f"])
+
+
+def _dirty(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Format numbers the way spreadsheets and field exports do."""
+    styles = rng.integers(0, 4, size=len(values))
+    out = np.empty(len(values), dtype=object)
+    for style, fmt in enumerate(["{:,.1f}", " {} ", "{} ", "{:,}"]):
+        sel = styles == style
+        out[sel] = [fmt.format(v) for v in values[sel]]
+    # A few stray inner spaces ("38. 6"), which coerce_types strips
+    inner = rng.random(len(values)) < 0.25
+    out[inner] = [s.replace(".", ". ", 1) for s in out[inner]]
+    return out
+
+
+def make_herd(rows: int, seed: int = 0, breed_mix: dict[str, float] = BREED_MIX,
+              dirty_frac: float = 0.0, missing_frac: float = 0.0) -> pd.DataFrame:
+    """Return a raw herd frame with the REQUIRED_COLUMNS, as it would arrive in an upload.
+
+    With dirty_frac/missing_frac above 0, that fraction of numeric cells is
+    written as messy strings / left empty, and breed and boolean cells get
+    inconsistent spellings.
+    """
+    rng = np.random.default_rng(seed)
+    breeds = np.array(list(breed_mix))
+    p = np.array(list(breed_mix.values()), dtype=float)
+    breed_idx = rng.choice(len(breeds), size=rows, p=p / p.sum())
+    states = list(HEALTH_STATES)
+    state = rng.choice(len(states), size=rows, p=[HEALTH_STATES[s][0] for s in states])
+
+    profile = np.array([BREED_PROFILES.get(b, (650, 15.0)) for b in breeds])
+
+    data = {ID_COL: np.char.add("S", np.char.zfill(np.arange(1, rows + 1).astype(str), 7))}
+    data[CATEGORICAL[0]] = breeds[breed_idx]
+    for col in NUMERIC:
+        mean, std = BASELINE[col]
+        values = rng.normal(mean, std, size=rows)
+        if col == "Weight_kg":
+            values += profile[breed_idx, 0]
+        elif col == "Milk_Yield":
+            values += profile[breed_idx, 1]
+        for i, s in enumerate(states):
+            shift = HEALTH_STATES[s][1].get(col)
+            if shift:
+                values[state == i] += shift
+        values = np.maximum(values, 0).round(DECIMALS.get(col, 1))
+        data[col] = values.astype(int) if DECIMALS.get(col, 1) == 0 else values
+    vaccinated = rng.random(rows) < 0.6
+    data[BOOLEAN[0]] = vaccinated.astype(int)
+    df = pd.DataFrame(data)
+
+    if dirty_frac > 0:
+        for col in NUMERIC:
+            df[col] = df[col].astype(object)
+            idx = np.flatnonzero(rng.random(rows) < dirty_frac)
+            df.loc[idx, col] = _dirty(df.loc[idx, col].to_numpy(), rng)
+        idx = np.flatnonzero(rng.random(rows) < dirty_frac)
+        df.loc[idx, CATEGORICAL[0]] = " " + df.loc[idx, CATEGORICAL[0]]
+        truthy, falsy = BOOLEAN_SPELLINGS
+        col = BOOLEAN[0]
+        spelled = np.where(vaccinated, rng.choice(truthy, size=rows), rng.choice(falsy, size=rows))
+        idx = np.flatnonzero(rng.random(rows) < dirty_frac)
+        df[col] = df[col].astype(object)
+        df.loc[idx, col] = spelled[idx]
+    if missing_frac > 0:
+        for col in NUMERIC:
+            idx = np.flatnonzero(rng.random(rows) < missing_frac)
+            df[col] = df[col].astype(object)
+            df.loc[idx, col] = None
+    return df[REQUIRED_COLUMNS]
+
+
+def make_herd_csv(rows: int, **kwargs) -> bytes:
+    return make_herd(rows, **kwargs).to_csv(index=False).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dirty", type=float, default=0.0, help="fraction of messy numeric cells")
+    parser.add_argument("--missing", type=float, default=0.0, help="fraction of empty numeric cells")
+    parser.add_argument("-o", "--output", default="-", help="CSV path, '-' for stdout")
+    args = parser.parse_args()
+
+    df = make_herd(args.rows, seed=args.seed, dirty_frac=args.dirty, missing_frac=args.missing)
+    if args.output == "-":
+        print(df.to_csv(index=False), end="")
+    else:
+        df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# backend/models/assign.py
+import numpy as np
+import pandas as pd
+
+from backend.models.preprocess import FeatureEncoder, coerce_types
+from backend.utils.schema import ID_COL
+
+
+def cluster_centroids(X: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return (cluster_ids, centroids): the mean feature row of each cluster.
+
+    These are the `cluster_summary` means expressed in the encoded (scaled,
+    one-hot) feature space the clusters were found in.
+    """
+    cluster_ids, inverse = np.unique(labels, return_inverse=True)
+    centroids = np.zeros((len(cluster_ids), X.shape[1]))
+    np.add.at(centroids, inverse, X)
+    centroids /= np.bincount(inverse)[:, None]
+    return cluster_ids, centroids
+
+
+class ClusterAssigner:
+    """Assigns new animals to the clusters of an existing run.
+
+    Records are encoded with the run's fitted FeatureEncoder and placed in
+    the cluster with the nearest centroid, so cluster IDs stay stable and no
+    Ward run is needed. Each assignment carries the Euclidean distance to
+    that centroid and a confidence of 1 - d_nearest / d_second: 0 halfway
+    between two clusters, 1 on the centroid itself.
+    """
+
+    def __init__(self, encoder: FeatureEncoder, X: np.ndarray, labels: np.ndarray, projection=None):
+        self.encoder = encoder
+        # The run's reduction (see models.reduce), if X was projected before Ward
+        self.projection = projection
+        self.cluster_ids, self.centroids = cluster_centroids(X, labels)
+        self._centroid_sq = (self.centroids ** 2).sum(axis=1)
+
+    def matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Encode (and project) a coerced, filled frame into the clustering space."""
+        X = self.encoder.transform(df)
+        return X if self.projection is None else self.projection.transform(X)
+
+    def distances(self, X: np.ndarray) -> np.ndarray:
+        """Euclidean distance of every row of `X` to every centroid."""
+        sq = (X ** 2).sum(axis=1)[:, None] - 2.0 * X @ self.centroids.T + self._centroid_sq[None, :]
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def assign(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Score raw records; one row per animal in the /cluster `assignments` shape.
+
+        Columns: ID, cluster_id, distance, confidence, unknown_breed.
+        """
+        df = self.encoder.fill(coerce_types(df))
+        d = self.distances(self.matrix(df))
+        nearest = d.argmin(axis=1)
+        rows = np.arange(len(d))
+        d_nearest = d[rows, nearest]
+        if d.shape[1] > 1:
+            d_second = np.partition(d, 1, axis=1)[:, 1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                confidence = np.where(d_second > 0, 1.0 - d_nearest / d_second, 0.0)
+        else:
+            confidence = np.ones(len(d))
+        return pd.DataFrame({
+            ID_COL: df[ID_COL].to_numpy(),
+            "cluster_id": self.cluster_ids[nearest],
+            "distance": d_nearest,
+            "confidence": confidence,
+            "unknown_breed": self.encoder.unknown_categories(df),
+        })
@@ -1,12 +1,256 @@
 # backend/models/cluster.py
+import os
+import time
+
 import numpy as np
 import pandas as pd
-from sklearn.cluster import AgglomerativeClustering
 
-def run_ward(X: np.ndarray, n_clusters: int = 4):
-    model = AgglomerativeClustering(linkage="ward", n_clusters=n_clusters)
-    labels = model.fit_predict(X)
-    return labels
+# Above this many rows exact Ward (O(n²) memory) is replaced by the two-stage
+# path: micro-clusters from a streaming pre-clusterer, then Ward on centroids.
+LARGE_HERD_ROWS = int(os.environ.get("HERDV_LARGE_HERD_ROWS", "20000"))
+MICRO_CLUSTERS = int(os.environ.get("HERDV_MICRO_CLUSTERS", "2000"))
+CLUSTER_MODES = ("auto", "exact", "two_stage")
+# Silhouette is O(n²); it is estimated on a stratified sample of this many rows
+SILHOUETTE_SAMPLE = int(os.environ.get("HERDV_SILHOUETTE_SAMPLE", "2000"))
+# Default wall-clock budget for scoring a range of ks
+AUTO_K_BUDGET_SECONDS = float(os.environ.get("HERDV_AUTO_K_BUDGET_SECONDS", "5"))
+
+
+def micro_cluster(X: np.ndarray, n_micro: int = MICRO_CLUSTERS, random_state: int = 0):
+    """Compress rows of `X` into at most `n_micro` micro-clusters.
+
+    Returns (centroids, weights, members): exact centroid and row count of
+    each non-empty micro-cluster, and the micro-cluster index of every row.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_micro = max(1, min(int(n_micro), X.shape[0]))
+    km = MiniBatchKMeans(
+        n_clusters=n_micro,
+        batch_size=max(4096, 2 * n_micro),
+        init_size=3 * n_micro,
+        n_init=1,
+        # A single streaming pass is enough: Ward on the centroids does the
+        # real grouping, the micro-clusters only need to be tight
+        max_iter=1,
+        random_state=random_state,
+    )
+    raw = km.fit_predict(X)
+    # Drop empty micro-clusters and renumber the rest densely
+    _, members = np.unique(raw, return_inverse=True)
+    weights = np.bincount(members).astype(float)
+    centroids = np.zeros((len(weights), X.shape[1]))
+    np.add.at(centroids, members, X)
+    centroids /= weights[:, None]
+    return centroids, weights, members
+
+
+def weighted_ward_linkage(centroids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Ward linkage over weighted points, in scipy's linkage-matrix format.
+
+    Each centroid starts as a cluster of `weights[i]` observations, so the
+    merge costs equal those of exact Ward run from these groups upwards.
+    Uses the nearest-neighbour chain algorithm: O(m²) time, O(m) memory.
+    Column 3 holds the number of underlying observations in each cluster.
+    """
+    m = centroids.shape[0]
+    C = np.array(centroids, dtype=float)
+    W = np.array(weights, dtype=float)
+    active = np.ones(m, dtype=bool)
+    pairs = np.empty((max(m - 1, 0), 2), dtype=np.intp)
+    heights = np.empty(max(m - 1, 0))
+    n_merged = 0
+    chain: list[int] = []
+    while n_merged < m - 1:
+        if not chain:
+            chain.append(int(np.flatnonzero(active)[0]))
+        a = chain[-1]
+        d = ((C - C[a]) ** 2).sum(axis=1) * (2.0 * W * W[a] / (W + W[a]))
+        d[~active] = np.inf
+        d[a] = np.inf
+        b = int(np.argmin(d))
+        # Prefer the previous chain element on ties so the chain terminates
+        if len(chain) > 1 and d[chain[-2]] <= d[b]:
+            b = chain[-2]
+        if len(chain) > 1 and b == chain[-2]:
+            chain.pop()
+            chain.pop()
+            pairs[n_merged] = (a, b)
+            heights[n_merged] = np.sqrt(d[b])
+            n_merged += 1
+            C[a] = (W[a] * C[a] + W[b] * C[b]) / (W[a] + W[b])
+            W[a] += W[b]
+            active[b] = False
+        else:
+            chain.append(b)
+
+    # Sort merges by height and relabel them into scipy's cluster numbering
+    Z = np.empty((max(m - 1, 0), 4))
+    parent = np.arange(2 * m - 1)
+    size = np.zeros(2 * m - 1)
+    size[:m] = weights
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for row, i in enumerate(np.argsort(heights, kind="mergesort")):
+        a, b = find(pairs[i, 0]), find(pairs[i, 1])
+        new = m + row
+        parent[a] = parent[b] = new
+        size[new] = size[a] + size[b]
+        Z[row] = (min(a, b), max(a, b), heights[i], size[new])
+    return Z
+
+
+class WardTree:
+    """Ward linkage tree built once per dataset and cut for any number of clusters.
+
+    Building the tree is the expensive step; every cut afterwards is O(n), so a
+    single tree serves `/cluster`, `/dendrogram` and `/cluster/compare`.
+
+    mode="exact" runs Ward on every row. mode="two_stage" first compresses the
+    rows into micro-clusters and runs weighted Ward on their centroids, so the
+    tree's leaves are micro-clusters and `members` maps each row to its leaf.
+    mode="auto" picks two_stage above `large_herd_rows` rows.
+    """
+
+    def __init__(self, X: np.ndarray, mode: str = "auto",
+                 large_herd_rows: int = LARGE_HERD_ROWS, micro_clusters: int = MICRO_CLUSTERS):
+        if mode not in CLUSTER_MODES:
+            raise ValueError(f"Unknown clustering mode: {mode}")
+        if mode == "auto":
+            mode = "two_stage" if X.shape[0] > large_herd_rows else "exact"
+        self.mode = mode
+        self.n_rows = int(X.shape[0])
+        if mode == "two_stage" and self.n_rows > 1:
+            centroids, weights, self.members = micro_cluster(X, micro_clusters)
+            self.linkage = weighted_ward_linkage(centroids, weights)
+        else:
+            from scipy.cluster.hierarchy import linkage
+            self.members = None
+            self.linkage = linkage(X, method="ward") if self.n_rows > 1 else np.empty((0, 4))
+        self.n_leaves = self.linkage.shape[0] + 1
+        self._cuts: dict[int, np.ndarray] = {}
+
+    def cut(self, n_clusters: int) -> np.ndarray:
+        """Return 0-based cluster labels, one per input row, for `n_clusters` clusters."""
+        k = max(1, min(int(n_clusters), self.n_leaves))
+        labels = self._cuts.get(k)
+        if labels is None:
+            if self.n_leaves < 2:
+                labels = np.zeros(self.n_leaves, dtype=int)
+            else:
+                from scipy.cluster.hierarchy import fcluster
+                labels = fcluster(self.linkage, t=k, criterion="maxclust") - 1
+            if self.members is not None:
+                labels = labels[self.members]
+            self._cuts[k] = labels
+        return labels
+
+    def info(self) -> dict:
+        return {"mode": self.mode, "rows": self.n_rows, "leaves": self.n_leaves}
+
+
+def compare_cuts(tree: WardTree, ks: list[int]):
+    """Cut `tree` at every k and return per-k counts and the pairwise ARI matrix."""
+    from sklearn.metrics import adjusted_rand_score
+
+    labels_map = {k: tree.cut(k) for k in ks}
+    counts = {}
+    for k, labels in labels_map.items():
+        unique, c = np.unique(labels, return_counts=True)
+        counts[k] = {int(u): int(n) for u, n in zip(unique, c)}
+
+    # ARI is symmetric, so score each unordered pair once and mirror it
+    ari = {k: {} for k in ks}
+    for i, a in enumerate(ks):
+        ari[a][a] = 1.0
+        for b in ks[i + 1:]:
+            score = 1.0 if a == b else float(adjusted_rand_score(labels_map[a], labels_map[b]))
+            ari[a][b] = score
+            ari[b][a] = score
+    return counts, ari
+
+
+def stratified_sample(labels: np.ndarray, size: int, random_state: int = 0) -> np.ndarray:
+    """Row indices of a sample of about `size` rows, drawn from each cluster in proportion.
+
+    Every cluster keeps at least two rows (or all it has) so silhouette sees
+    each of them.
+    """
+    n = len(labels)
+    if n <= size:
+        return np.arange(n)
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for cluster in np.unique(labels):
+        rows = np.flatnonzero(labels == cluster)
+        take = min(len(rows), max(2, int(round(size * len(rows) / n))))
+        picked.append(rng.choice(rows, size=take, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def score_cuts(tree: WardTree, X: np.ndarray, ks: list[int], sample_size: int = SILHOUETTE_SAMPLE,
+               time_budget: float = AUTO_K_BUDGET_SECONDS, random_state: int = 0) -> dict:
+    """Score cuts of `tree` with internal quality metrics and recommend a k.
+
+    Calinski–Harabasz and Davies–Bouldin are linear in the herd size and use
+    every row; silhouette uses a stratified sample of `sample_size` rows. ks
+    are scored in order until `time_budget` seconds have passed. The
+    recommendation is the k with the best mean rank over the three metrics
+    (silhouette breaks ties).
+    """
+    from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+
+    start = time.perf_counter()
+    scores = []
+    for k in ks:
+        if scores and time.perf_counter() - start > time_budget:
+            break
+        labels = tree.cut(k)
+        n_found = len(np.unique(labels))
+        if n_found < 2 or n_found >= len(labels):
+            # Metrics are undefined for one cluster or one row per cluster
+            scores.append({"k": k, "clusters": n_found, "silhouette": None,
+                           "calinski_harabasz": None, "davies_bouldin": None})
+            continue
+        idx = stratified_sample(labels, sample_size, random_state)
+        scores.append({
+            "k": k,
+            "clusters": n_found,
+            "silhouette": float(silhouette_score(X[idx], labels[idx])),
+            "calinski_harabasz": float(calinski_harabasz_score(X, labels)),
+            "davies_bouldin": float(davies_bouldin_score(X, labels)),
+        })
+
+    valid = [s for s in scores if s["silhouette"] is not None]
+    best = {}
+    recommended = None
+    if valid:
+        best = {
+            "silhouette": max(valid, key=lambda s: s["silhouette"])["k"],
+            "calinski_harabasz": max(valid, key=lambda s: s["calinski_harabasz"])["k"],
+            "davies_bouldin": min(valid, key=lambda s: s["davies_bouldin"])["k"],
+        }
+        ranks = {s["k"]: 0.0 for s in valid}
+        for metric, higher_is_better in [("silhouette", True), ("calinski_harabasz", True),
+                                         ("davies_bouldin", False)]:
+            ordered = sorted(valid, key=lambda s: s[metric], reverse=higher_is_better)
+            for rank, s in enumerate(ordered):
+                ranks[s["k"]] += rank / 3
+        recommended = min(valid, key=lambda s: (ranks[s["k"]], -s["silhouette"]))["k"]
+    return {
+        "scores": scores,
+        "best": best,
+        "recommended_k": recommended,
+        "complete": len(scores) == len(ks),
+        "sample_size": int(min(sample_size, tree.n_rows)),
+        "elapsed": time.perf_counter() - start,
+    }
+
 
 def cluster_summary(df: pd.DataFrame, labels: np.ndarray):
     df = df.copy()
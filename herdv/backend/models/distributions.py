@@ -0,0 +1,102 @@
+# backend/models/distributions.py
+import numpy as np
+import pandas as pd
+
+from backend.utils.schema import NUMERIC
+
+# Whiskers reach the furthest value within WHISKER_IQR interquartile ranges
+# of the quartiles (the matplotlib/pandas boxplot convention)
+WHISKER_IQR = 1.5
+HISTOGRAM_BINS = 20
+# Outliers listed per feature and cluster (the most extreme ones); the
+# total is always reported in `outlier_count`
+MAX_OUTLIERS = 50
+_STATS = ("n", "mean", "min", "q1", "median", "q3", "max", "whisker_low", "whisker_high")
+
+
+def _quantile(S: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """Per-column linear-interpolated quantile of column-sorted S with n valid rows each."""
+    pos = q * np.maximum(n - 1, 0)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    cols = np.arange(S.shape[1])
+    return S[lo, cols] + (pos - lo) * (S[hi, cols] - S[lo, cols])
+
+
+def _extreme(values: np.ndarray, centre: float, cap: int) -> list[float]:
+    if len(values) > cap:
+        values = values[np.argsort(-np.abs(values - centre), kind="stable")[:cap]]
+    return np.sort(values).tolist()
+
+
+def cluster_distributions(df_labeled: pd.DataFrame, features: list[str] | None = None,
+                          bins: int = HISTOGRAM_BINS, max_outliers: int = MAX_OUTLIERS) -> dict:
+    """Boxplot statistics, means and histograms of every feature by cluster.
+
+    Each cluster's rows are sorted once for all features together; quartiles,
+    whiskers and outliers then come from index arithmetic on the sorted
+    block, and the histograms for all clusters and features from a single
+    bincount. Histogram edges are shared by all clusters of a feature so
+    they can be compared directly. The result is columnar: every statistic
+    is a list with one entry per cluster, in the order of `clusters`.
+    """
+    features = list(NUMERIC if features is None else features)
+    labels = df_labeled["Cluster"].to_numpy()
+    V = df_labeled[features].to_numpy(dtype=np.float64)
+    clusters, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    k, f = len(clusters), len(features)
+
+    stats = {name: np.full((k, f), np.nan) for name in _STATS}
+    outliers = [[None] * k for _ in range(f)]
+    outlier_count = np.zeros((k, f), dtype=int)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    for c in range(k):
+        # NaN sorts last, so the first n[j] rows of column j are its values
+        S = np.sort(V[order[starts[c]:starts[c + 1]]], axis=0)
+        n = (~np.isnan(S)).sum(axis=0)
+        q1, med, q3 = (_quantile(S, n, q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        low_out = (S < (q1 - WHISKER_IQR * iqr)).sum(axis=0)
+        high_start = (S <= (q3 + WHISKER_IQR * iqr)).sum(axis=0)
+        cols, last = np.arange(f), len(S) - 1
+        empty = n == 0
+        row = {
+            "n": n, "mean": S.sum(axis=0, where=~np.isnan(S)) / np.maximum(n, 1),
+            "min": S[0], "q1": q1, "median": med, "q3": q3, "max": S[np.clip(n - 1, 0, last), cols],
+            "whisker_low": S[np.clip(low_out, 0, last), cols],
+            "whisker_high": S[np.clip(high_start - 1, 0, last), cols],
+        }
+        for name, values in row.items():
+            stats[name][c] = values if name == "n" else np.where(empty, np.nan, values)
+        outlier_count[c] = low_out + (n - high_start)
+        for j in range(f):
+            flagged = np.concatenate([S[:low_out[j], j], S[high_start[j]:n[j], j]])
+            outliers[j][c] = _extreme(flagged, med[j], max_outliers)
+
+    # Shared edges per feature, then one bincount over (feature, cluster, bin)
+    present = ~np.isnan(V)
+    lo = np.where(present.any(axis=0), np.min(V, axis=0, where=present, initial=np.inf), 0.0)
+    hi = np.where(present.any(axis=0), np.max(V, axis=0, where=present, initial=-np.inf), 0.0)
+    width = np.where(hi > lo, (hi - lo) / bins, 1.0)
+    edges = lo[:, None] + width[:, None] * np.arange(bins + 1)
+    idx = np.clip(np.floor((np.where(present, V, lo) - lo) / width), 0, bins - 1).astype(int)
+    # values on an edge can round into the neighbouring bin; settle them
+    # against the edges we return (the last bin is closed, as in np.histogram)
+    cols = np.arange(f)[None, :]
+    idx -= V < edges[cols, idx]
+    idx += (V >= edges[cols, idx + 1]) & (idx < bins - 1)
+    flat = (cols * k + inverse[:, None]) * bins + idx
+    hist = np.bincount(flat[present], minlength=f * k * bins).reshape(f, k, bins)
+
+    out = {}
+    for j, feature in enumerate(features):
+        entry = {name: [None if np.isnan(v) else float(v) for v in stats[name][:, j]]
+                 for name in _STATS if name != "n"}
+        entry["n"] = stats["n"][:, j].astype(int).tolist()
+        entry["outliers"] = outliers[j]
+        entry["outlier_count"] = outlier_count[:, j].tolist()
+        entry["bin_edges"] = edges[j].tolist()
+        entry["histogram"] = hist[j].tolist()
+        out[feature] = entry
+    return {"clusters": clusters.tolist(), "counts": counts.tolist(), "bins": bins, "features": out}
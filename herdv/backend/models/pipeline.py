@@ -0,0 +1,156 @@
+# backend/models/pipeline.py
+import numpy as np
+import pandas as pd
+
+from backend.models.assign import ClusterAssigner
+from backend.models.preprocess import coerce_types, fit_preprocess, matrix_info
+from backend.models.cluster import WardTree, cluster_summary, herd_kpis
+from backend.models.reduce import REDUCE_VARIANCE, Projection
+from backend.models.recommend import cluster_recommendations
+from backend.utils.datasets import read_dataset
+from backend.utils.ingest import read_csv
+from backend.utils.metrics import StageTimer
+from backend.utils.schema import SEASON_COL
+
+
+def _no_progress(stage: str, fraction: float):
+    pass
+
+
+def select_season(df: pd.DataFrame, season: str) -> pd.DataFrame:
+    """Rows measured in `season` (case-insensitive), without the Season column."""
+    if SEASON_COL not in df.columns:
+        raise ValueError(f"Cannot filter by season: no {SEASON_COL} column.")
+    mask = df[SEASON_COL].astype(str).str.strip().str.lower() == season.strip().lower()
+    if not mask.any():
+        raise ValueError(f"No rows for season {season!r}.")
+    return df.loc[mask].drop(columns=SEASON_COL).reset_index(drop=True)
+
+
+def split_groups(df: pd.DataFrame, group_by: list[str]):
+    """Yield ({column: value}, rows) per group, without the grouping columns.
+
+    With no `group_by` the whole frame is a single group with an empty key.
+    """
+    if not group_by:
+        yield {}, df
+        return
+    missing = [c for c in group_by if c not in df.columns]
+    if missing:
+        raise ValueError(f"Cannot group by missing columns: {missing}")
+    for values, rows in df.groupby(group_by, sort=True, dropna=False):
+        values = values if isinstance(values, tuple) else (values,)
+        key = {c: (v.item() if hasattr(v, "item") else v) for c, v in zip(group_by, values)}
+        yield key, rows.drop(columns=group_by).reset_index(drop=True)
+
+
+def cluster_dataframe(df: pd.DataFrame, n_clusters: int = 4, mode: str = "auto", progress=None,
+                      timer: StageTimer | None = None, season: str | None = None, reduce: str = "none",
+                      variance: float = REDUCE_VARIANCE, space: tuple | None = None):
+    """Run preprocess → (reduce) → Ward → summary → recommendations on one herd.
+
+    Returns the run: the objects follow-up endpoints need (tree, labels,
+    means, counts, labeled frame, assigner for new animals) plus `summary`,
+    the cluster-level part of the `/cluster` response. Everything is
+    picklable so the function can run in a worker process. `progress(stage, fraction)` is called as each stage
+    starts; per-stage wall times end up in `run["timings"]` ("linkage" is
+    the tree-building part of "ward"). With `season`, only that season's
+    rows are clustered.
+
+    `reduce` ("pca" or "randomized") projects the feature matrix onto the fewest
+    columns keeping `variance` of its variance before Ward. `space` is an
+    earlier run's (encoder, projection or None): the herd is then encoded
+    and projected exactly like that run's instead of fitting new ones.
+    """
+    progress = progress or _no_progress
+    timer = timer or StageTimer()
+    if season:
+        df = select_season(df, season)
+    progress("preprocess", 0.1)
+    with timer.stage("preprocess"):
+        if space is None:
+            X, encoder, df_clean = fit_preprocess(df)
+            projection = None
+        else:
+            encoder, projection = space
+            df_clean = encoder.fill(coerce_types(df))
+            X = encoder.transform(df_clean)
+    feature_names = encoder.feature_names
+    if projection is not None or (space is None and reduce != "none"):
+        progress("reduce", 0.2)
+        with timer.stage("reduce"):
+            if projection is None:
+                projection = Projection(reduce, variance).fit(X)
+            X = projection.transform(X)
+    # Build the Ward tree once; labels and the dendrogram both come from it.
+    # Large herds go through the two-stage (micro-cluster + Ward) path.
+    progress("ward", 0.3)
+    with timer.stage("ward"):
+        with timer.stage("linkage"):
+            tree = WardTree(X, mode=mode)
+        labels = tree.cut(n_clusters)
+    progress("summary", 0.7)
+    with timer.stage("summary"):
+        df_labeled, means, counts = cluster_summary(df_clean, labels)
+        # Fitted encoder + centroids let /runs/{run_id}/assign place new animals
+        assigner = ClusterAssigner(encoder, X, labels, projection)
+    with timer.stage("recommendations"):
+        recs = cluster_recommendations(means)
+
+    progress("summary", 0.85)
+    clusters = []
+    for _, m in means.iterrows():
+        cid = int(m["Cluster"])
+        clusters.append({
+            "cluster_id": cid,
+            "name": recs[cid]["name"],
+            "count": int(counts.loc[counts["Cluster"] == cid, "Count"].values[0]),
+            # columns such as sensor maxima can be missing for a whole cluster
+            "means": {k: None if pd.isna(m[k]) else float(m[k]) for k in m.index if k != "Cluster"},
+            "recommendation": recs[cid]["recommendation"]
+        })
+
+    kpis = herd_kpis(df_clean)
+
+    # Per-animal sections (assignments, labeled_records) are rendered from
+    # run["df"] on request, so they are neither built nor pickled here
+    summary = {
+        "clusters": clusters,
+        "kpis": kpis,
+        "feature_names": feature_names,
+        "clustering": {**tree.info(), "feature_matrix": matrix_info(X),
+                       "reduction": None if projection is None else projection.info()},
+    }
+    run = {"tree": tree, "labels": labels, "means": means, "counts": counts, "df": df_labeled,
+           "assigner": assigner, "summary": summary, "timings": timer.stages}
+    progress("done", 1.0)
+    return run
+
+
+def run_matrix(run: dict) -> np.ndarray:
+    """Rebuild a run's (reduced) feature matrix from its fitted encoder; runs do not keep X."""
+    return run["assigner"].matrix(run["df"])
+
+
+def cluster_csv(source, n_clusters: int = 4, mode: str = "auto", progress=None, season: str | None = None,
+                **reduction):
+    """Parse CSV (bytes, or the path of a spooled upload) and cluster it; see `cluster_dataframe`."""
+    progress = progress or _no_progress
+    timer = StageTimer()
+    progress("parse", 0.0)
+    with timer.stage("parse"):
+        df = read_csv(source)
+    return cluster_dataframe(df, n_clusters=n_clusters, mode=mode, progress=progress, timer=timer, season=season,
+                             **reduction)
+
+
+def cluster_dataset(path: str, n_clusters: int = 4, mode: str = "auto", progress=None, season: str | None = None,
+                    **reduction):
+    """Cluster a stored dataset (see utils.datasets) without any CSV parsing; see `cluster_dataframe`."""
+    progress = progress or _no_progress
+    timer = StageTimer()
+    progress("load", 0.0)
+    with timer.stage("load"):
+        df = read_dataset(path)
+    return cluster_dataframe(df, n_clusters=n_clusters, mode=mode, progress=progress, timer=timer, season=season,
+                             **reduction)
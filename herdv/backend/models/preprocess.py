@@ -1,10 +1,39 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from backend.utils.schema import CATEGORICAL, BOOLEAN, NUMERIC, ID_COL, REQUIRED_COLUMNS
+from backend.utils.schema import CATEGORICAL, BOOLEAN, NUMERIC, ID_COL, REQUIRED_COLUMNS, TRUE_VALUES
+
+
+def _to_bool_int(s: pd.Series) -> pd.Series:
+    """Vectorized `1 if str(x).strip().lower() in TRUE_VALUES else 0`."""
+    if pd.api.types.is_bool_dtype(s):
+        return s.astype(int)
+    if pd.api.types.is_integer_dtype(s):
+        # str() of an integer is only ever "1" among TRUE_VALUES
+        return s.eq(1).astype(int)
+    return s.astype(str).str.strip().str.lower().isin(TRUE_VALUES).astype(int)
+
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+    """Coerce a column to numbers, cleaning numeric-like strings only if needed."""
+    # Columns the parser already read as numbers are clean; a str round trip
+    # would give back the same values. Bools are not numbers here.
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return s
+    out = pd.to_numeric(s, errors="coerce")
+    # Only values that did not parse need cleaning (removing whitespace and
+    # thousands separators cannot change a value that did), so a few dirty
+    # cells no longer cost a string pass over the whole column
+    failed = out.isna() & s.notna()
+    if failed.any():
+        cleaned = s[failed].astype(str).str.strip().str.replace(r"[\s,]+", "", regex=True)
+        # invalid values become NaN and will be filled later
+        out[failed] = pd.to_numeric(cleaned, errors="coerce")
+    return out
+
 
 def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    # Shallow copy: every coerced column is replaced, never written in place
+    df = df.copy(deep=False)
     missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
     if missing:
         raise ValueError(f"Missing columns: {missing}")
@@ -12,15 +41,9 @@ def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
     for col in CATEGORICAL:
         df[col] = df[col].astype(str)
     for col in BOOLEAN:
-        df[col] = df[col].map(
-            lambda x: 1 if str(x).strip().lower() in ["1","true","yes","y","t"] else 0
-        ).astype(int)
-    # Clean numeric-like strings: remove internal whitespace and common thousands separators
+        df[col] = _to_bool_int(df[col])
     for col in NUMERIC:
-        # convert to string, strip whitespace, remove internal spaces and commas
-        df[col] = df[col].astype(str).str.strip().str.replace(r"\s+", "", regex=True).str.replace(',', '')
-        # finally coerce to numeric, invalid values become NaN and will be filled later
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+        df[col] = _to_numeric(df[col])
     return df
 
 def validate_schema(df: pd.DataFrame) -> list[str]:
@@ -31,16 +54,89 @@ def validate_schema(df: pd.DataFrame) -> list[str]:
         issues.append(f"Non-numeric/NA values in: {bad}")
     return issues
 
-def preprocess(df: pd.DataFrame):
+# Feature matrices are float32: half the memory of float64. Exact Ward cuts
+# match the float64 ones; two-stage cuts differ less than between seeds.
+FEATURE_DTYPE = np.float32
+
+
+class FeatureEncoder:
+    """Preprocessing state fitted on one herd and reusable on new records.
+
+    Holds the median fill values, the fitted StandardScaler and the one-hot
+    categories, so records scored later land in the same feature space as
+    the herd the clusters were built from. Categories not seen during fit
+    encode as all zeros.
+    """
+
+    dtype = FEATURE_DTYPE
+
+    def __init__(self):
+        self.medians: pd.Series | None = None
+        self.scaler = None
+        self.categories: dict[str, list[str]] = {}
+
+    @property
+    def feature_names(self) -> list[str]:
+        return NUMERIC + BOOLEAN + [f"{col}_{c}" for col in CATEGORICAL for c in self.categories[col]]
+
+    def fit(self, df: pd.DataFrame) -> "FeatureEncoder":
+        """Fit on a frame already passed through `coerce_types`."""
+        from sklearn.preprocessing import StandardScaler
+
+        self.medians = df[NUMERIC].median(numeric_only=True)
+        # Same (sorted) column order pd.get_dummies produces
+        self.categories = {col: sorted(df[col].unique()) for col in CATEGORICAL}
+        self.scaler = StandardScaler().fit(df[NUMERIC].fillna(self.medians))
+        return self
+
+    def fill(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fill missing numerics with the fitted medians (no-op when complete)."""
+        # Column by column, replacing rather than writing into the frame's
+        # arrays, which may be shared with the caller's frame
+        for col in NUMERIC:
+            if df[col].isna().any():
+                df[col] = df[col].fillna(self.medians[col])
+        return df
+
+    def unknown_categories(self, df: pd.DataFrame) -> np.ndarray:
+        """Per-row flag: some categorical value was not seen during fit."""
+        unknown = np.zeros(len(df), dtype=bool)
+        for col in CATEGORICAL:
+            unknown |= ~df[col].isin(self.categories[col]).to_numpy()
+        return unknown
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Feature matrix for a coerced, filled frame.
+
+        Every column is written straight into one preallocated matrix:
+        scaled numerics one column at a time, then the boolean columns, then
+        the one-hot blocks set from categorical codes. No dense dummies or
+        intermediate blocks are built.
+        """
+        X = np.zeros((len(df), len(self.feature_names)), dtype=self.dtype)
+        mean, scale = self.scaler.mean_, self.scaler.scale_
+        for i, col in enumerate(NUMERIC):
+            X[:, i] = (df[col].to_numpy(dtype=np.float64) - mean[i]) / scale[i]
+        offset = len(NUMERIC)
+        for col in BOOLEAN:
+            X[:, offset] = df[col].to_numpy()
+            offset += 1
+        for col in CATEGORICAL:
+            codes = pd.Categorical(df[col], categories=self.categories[col]).codes
+            known = np.flatnonzero(codes >= 0)
+            X[known, offset + codes[known]] = 1
+            offset += len(self.categories[col])
+        return X
+
+
+def matrix_info(X: np.ndarray) -> dict:
+    """Shape, dtype and memory footprint of a feature matrix."""
+    return {"rows": int(X.shape[0]), "columns": int(X.shape[1]), "dtype": str(X.dtype), "bytes": int(X.nbytes)}
+
+
+def fit_preprocess(df: pd.DataFrame):
+    """Coerce and encode a herd; returns (X, fitted FeatureEncoder, clean frame)."""
     df = coerce_types(df)
-    issues = validate_schema(df)
-    if issues:
-        df[NUMERIC] = df[NUMERIC].fillna(df[NUMERIC].median(numeric_only=True))
-    X_cat = pd.get_dummies(df[CATEGORICAL], drop_first=False)
-    X_bool = df[BOOLEAN]
-    X_num = df[NUMERIC]
-    scaler = StandardScaler()
-    X_num_scaled = scaler.fit_transform(X_num)
-    X = np.hstack([X_num_scaled, X_bool.values, X_cat.values])
-    feature_names = NUMERIC + BOOLEAN + list(X_cat.columns)
-    return X, scaler, feature_names, df
+    encoder = FeatureEncoder().fit(df)
+    df = encoder.fill(df)
+    return encoder.transform(df), encoder, df
@@ -1,39 +1,92 @@
 # backend/models/recommend.py
+import operator
+
+import numpy as np
 import pandas as pd
 
-def cluster_recommendations(means: pd.DataFrame) -> dict[int, dict]:
-    herd_means = means.mean(numeric_only=True)
-    herd_median = means.median(numeric_only=True)
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# Declarative rule table, evaluated in order. Each rule fires when all of its
+# conditions hold. A condition is (column, op, threshold) where threshold is
+# a number, "mean"/"median" of the reference frame, or (stat, factor).
+# `label` names a cluster the rule fires for; `action` is the advice given.
+RULES = [
+    {"key": "high_yield", "label": "High Yielders", "action": None,
+     "when": [("Milk_Yield", ">=", "mean")]},
+    {"key": "high_parasite", "label": "High Parasite Load",
+     "action": "Start deworming protocol and rotate pasture; schedule fecal egg count recheck.",
+     "when": [("Parasite_Load_Index", ">=", ("median", 1.2))]},
+    {"key": "low_forage", "label": None,
+     "action": "Improve forage quality; review ration with nutritionist.",
+     "when": [("Forage_Quality_Index", "<", "median")]},
+    {"key": "heat_stress", "label": "At‑Risk (Heat/Illness)",
+     "action": "Provide shade and cool water; evaluate for fever; consult veterinarian.",
+     "when": [("Ear_Temperature_C", ">", 39.5), ("Respiration_Rate_BPM", ">", 35)]},
+    {"key": "low_fertility", "label": None,
+     "action": "Conduct reproductive assessment; check minerals and body condition.",
+     "when": [("Fertility_Score", "<", "median")]},
+    {"key": "low_rumination", "label": None,
+     "action": "Monitor rumination; adjust fiber length and feeding schedule.",
+     "when": [("Rumination_Minutes_Per_Day", "<", "median")]},
+    {"key": "energy_deficit", "label": None,
+     "action": "Assess energy balance; consider dietary energy increase.",
+     "when": [("Weight_kg", "<", "mean"), ("Movement_Score", ">", "mean")]},
+]
+DEFAULT_NAME = "Balanced"
+DEFAULT_ACTION = "Maintain current management and routine monitoring."
+
+
+def _column(df: pd.DataFrame, col: str) -> np.ndarray:
+    # Missing columns count as 0, as the original per-row rules did
+    if col not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+
+
+def _threshold(spec, col: str, stats: dict) -> float:
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    stat, factor = (spec, 1.0) if isinstance(spec, str) else spec
+    return float(stats[stat].get(col, 0)) * factor
 
-    recs = {}
-    for _, row in means.iterrows():
-        c = int(row["Cluster"])
-        cluster_name = []
-        actions = []
-
-        # naming heuristics
-        if row.get("Milk_Yield", 0) >= herd_means.get("Milk_Yield", 0):
-            cluster_name.append("High Yielders")
-        if row.get("Parasite_Load_Index", 0) >= herd_median.get("Parasite_Load_Index", 0) * 1.2:
-            cluster_name.append("High Parasite Load")
-            actions.append("Start deworming protocol and rotate pasture; schedule fecal egg count recheck.")
-        if row.get("Forage_Quality_Index", 0) < herd_median.get("Forage_Quality_Index", 0):
-            actions.append("Improve forage quality; review ration with nutritionist.")
-        if row.get("Ear_Temperature_C", 0) > 39.5 and row.get("Respiration_Rate_BPM", 0) > 35:
-            cluster_name.append("At‑Risk (Heat/Illness)")
-            actions.append("Provide shade and cool water; evaluate for fever; consult veterinarian.")
-        if row.get("Fertility_Score", 0) < herd_median.get("Fertility_Score", 0):
-            actions.append("Conduct reproductive assessment; check minerals and body condition.")
-        if row.get("Rumination_Minutes_Per_Day", 0) < herd_median.get("Rumination_Minutes_Per_Day", 0):
-            actions.append("Monitor rumination; adjust fiber length and feeding schedule.")
-        if row.get("Weight_kg", 0) < herd_means.get("Weight_kg", 0) and row.get("Movement_Score", 0) > herd_means.get("Movement_Score", 0):
-            actions.append("Assess energy balance; consider dietary energy increase.")
-
-        if not cluster_name:
-            cluster_name = ["Balanced"]
 
+def evaluate_rules(df: pd.DataFrame, reference: pd.DataFrame | None = None, rules=RULES) -> pd.DataFrame:
+    """Evaluate `rules` over every row of `df` at once.
+
+    Relative thresholds ("mean", "median") are taken from `reference`
+    (default: `df` itself), so the same table works on cluster means and on
+    the animal rows of a whole herd. Returns one boolean column per rule.
+    """
+    reference = df if reference is None else reference
+    stats = {"mean": reference.mean(numeric_only=True), "median": reference.median(numeric_only=True)}
+    flags = {}
+    for rule in rules:
+        fired = np.ones(len(df), dtype=bool)
+        for col, op, spec in rule["when"]:
+            # NaN compares False, so missing measurements never raise a flag
+            fired &= _OPS[op](_column(df, col), _threshold(spec, col, stats))
+        flags[rule["key"]] = fired
+    return pd.DataFrame(flags, index=df.index)
+
+
+def cluster_rollup(flags: pd.DataFrame, labels) -> pd.DataFrame:
+    """Per-cluster animal count plus how many / what share of animals each rule flags."""
+    grouped = flags.groupby(np.asarray(labels))
+    counts = grouped.sum().astype(int)
+    share = grouped.mean().add_suffix("_share")
+    out = pd.concat([grouped.size().rename("Count"), counts, share], axis=1)
+    return out.rename_axis("Cluster").reset_index()
+
+
+def cluster_recommendations(means: pd.DataFrame) -> dict[int, dict]:
+    flags = evaluate_rules(means)
+    recs = {}
+    for c, fired in zip(means["Cluster"].astype(int), flags.to_numpy()):
+        hits = [rule for rule, f in zip(RULES, fired) if f]
+        names = [r["label"] for r in hits if r["label"]] or [DEFAULT_NAME]
+        actions = [r["action"] for r in hits if r["action"]]
         recs[c] = {
-            "name": ", ".join(cluster_name),
-            "recommendation": " ".join(actions) if actions else "Maintain current management and routine monitoring."
+            "name": ", ".join(names),
+            "recommendation": " ".join(actions) if actions else DEFAULT_ACTION,
         }
     return recs
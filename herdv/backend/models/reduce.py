@@ -0,0 +1,121 @@
+# backend/models/reduce.py
+import os
+import time
+
+import numpy as np
+
+from backend.models.preprocess import FEATURE_DTYPE
+
+REDUCE_METHODS = ("none", "pca", "randomized")
+# Share of the feature matrix's total variance the reduced columns keep
+REDUCE_VARIANCE = float(os.environ.get("HERDV_REDUCE_VARIANCE", "0.95"))
+# Columns of the first random sketch; doubled until the variance target is met
+SKETCH_COLUMNS = 16
+# X is centred in float64 blocks of about this many cells, never all at once
+_BLOCK_CELLS = 1 << 20
+
+
+def _blocks(X: np.ndarray, mean: np.ndarray):
+    """Yield (rows, centred float64 block) over X."""
+    step = max(1, _BLOCK_CELLS // max(X.shape[1], 1))
+    for start in range(0, X.shape[0], step):
+        yield slice(start, start + step), X[start:start + step].astype(np.float64) - mean
+
+
+def _covariance(X: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    cov = np.zeros((X.shape[1], X.shape[1]))
+    for _, block in _blocks(X, mean):
+        cov += block.T @ block
+    return cov / max(X.shape[0] - 1, 1)
+
+
+def _principal(cov: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Eigenvectors (as columns) and eigenvalues of `cov`, largest first."""
+    values, vectors = np.linalg.eigh(cov)
+    order = np.argsort(values)[::-1]
+    return vectors[:, order], np.maximum(values[order], 0.0)
+
+
+def _sketch_basis(X: np.ndarray, mean: np.ndarray, columns: int, rng: np.random.Generator) -> np.ndarray:
+    """Orthonormal basis (d x columns) of the range of Xc^T Xc Ω: one power iteration on a Gaussian sketch."""
+    omega = rng.standard_normal((X.shape[1], columns))
+    Y = np.empty((X.shape[0], columns))
+    for rows, block in _blocks(X, mean):
+        Y[rows] = block @ omega
+    Z = np.zeros((X.shape[1], columns))
+    for rows, block in _blocks(X, mean):
+        Z += block.T @ Y[rows]
+    return np.linalg.qr(Z)[0]
+
+
+class Projection:
+    """Linear reduction of the feature matrix fitted on one herd.
+
+    Keeps the fewest principal components whose share of the total variance
+    reaches `variance`. method="pca" takes them from the exact covariance
+    (cost grows with rows x columns²); method="randomized" from a random
+    sketch of X that is widened until the target is met (rows x columns x
+    components), which is cheaper once the encoded matrix is wide. The
+    projection is stored with the run and applied to new records, so they
+    land in the same reduced space as the herd.
+    """
+
+    def __init__(self, method: str = "pca", variance: float = REDUCE_VARIANCE, random_state: int = 0):
+        if method not in REDUCE_METHODS or method == "none":
+            raise ValueError(f"Unknown reduction method: {method}")
+        if not 0 < variance <= 1:
+            raise ValueError("variance must be in (0, 1].")
+        self.method, self.variance, self.random_state = method, variance, random_state
+        self.mean: np.ndarray | None = None
+        self.components: np.ndarray | None = None
+        self.variance_retained = 0.0
+        self.input_columns = 0
+        self.seconds = 0.0
+
+    def fit(self, X: np.ndarray) -> "Projection":
+        t = time.perf_counter()
+        d = self.input_columns = X.shape[1]
+        self.mean = X.mean(axis=0, dtype=np.float64)
+        if self.method == "pca":
+            basis, captured = _principal(_covariance(X, self.mean))
+            total = captured.sum()
+        else:
+            rng = np.random.default_rng(self.random_state)
+            total = sum(float((block ** 2).sum()) for _, block in _blocks(X, self.mean)) / max(X.shape[0] - 1, 1)
+            columns = min(SKETCH_COLUMNS, d)
+            while True:
+                Q = _sketch_basis(X, self.mean, columns, rng)
+                # exact PCA inside the sketched subspace
+                B = np.zeros((Q.shape[1], Q.shape[1]))
+                for _, block in _blocks(X, self.mean):
+                    P = block @ Q
+                    B += P.T @ P
+                rotation, captured = _principal(B / max(X.shape[0] - 1, 1))
+                basis = Q @ rotation
+                if columns >= d or total <= 0 or captured.sum() >= self.variance * total:
+                    break
+                columns = min(2 * columns, d)
+        share = np.cumsum(captured) / total if total > 0 else np.ones(len(captured))
+        m = min(int(np.searchsorted(share, self.variance - 1e-12)) + 1, len(share))
+        self.components = basis[:, :m].astype(FEATURE_DTYPE)
+        self.variance_retained = float(share[m - 1])
+        self.seconds = time.perf_counter() - t
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Project rows encoded like the fitted herd's (see FeatureEncoder.transform)."""
+        if X.shape[1] != self.input_columns:
+            raise ValueError(f"Expected {self.input_columns} feature columns, got {X.shape[1]}.")
+        # centring first would copy X; subtract the projected mean instead
+        offset = (self.mean @ self.components).astype(FEATURE_DTYPE)
+        return X @ self.components - offset
+
+    def info(self) -> dict:
+        return {
+            "method": self.method,
+            "variance_target": self.variance,
+            "variance_retained": self.variance_retained,
+            "input_columns": self.input_columns,
+            "components": int(self.components.shape[1]),
+            "seconds": self.seconds,
+        }
@@ -0,0 +1,220 @@
+# backend/models/sensors.py
+"""Incremental daily aggregation of raw sensor readings into herd features.
+
+Readings are reduced chunk by chunk to per-(animal, day) sums, counts and
+maxima. Those merge exactly with the daily state kept from earlier appends,
+so every append only parses the new readings; the features are then
+recomputed from the (small) daily state over the trailing window.
+"""
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from backend.models.pipeline import _no_progress
+from backend.utils.datasets import companion_path, read_dataset, read_dataset_meta, write_dataset
+from backend.utils.ingest import CSVParseError
+from backend.utils.metrics import StageTimer
+from backend.utils.schema import ID_COL, SENSOR_READINGS, TIMESTAMP_COL
+
+# Features average the daily values of the last this many days; older days
+# are dropped from the state and late readings for them are ignored
+SENSOR_WINDOW_DAYS = int(os.environ.get("HERDV_SENSOR_WINDOW_DAYS", "7"))
+READING_CHUNK_ROWS = 1_000_000
+DAY_COL = "Day"
+DAYS_COL = "Sensor_Days"
+SENSOR_STATE = "sensors"
+_AGGS = ("sum", "count", "max")
+
+
+def _columns(sensors) -> list[str]:
+    return [f"{s}_{agg}" for s in sensors for agg in _AGGS]
+
+
+def _open(source: "bytes | str"):
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _daily(chunk: pd.DataFrame, sensors: list[str]) -> tuple[pd.DataFrame, int]:
+    """Per-(ID, Day) aggregates of one chunk, and how many rows had no usable timestamp."""
+    raw = chunk[TIMESTAMP_COL]
+    if pd.api.types.is_numeric_dtype(raw):
+        ts = pd.to_datetime(raw, unit="s", utc=True, errors="coerce")
+    else:
+        ts = pd.to_datetime(raw, utc=True, errors="coerce", format="ISO8601")
+        # padded values are rare; only strip the ones that failed to parse
+        retry = ts.isna() & raw.notna()
+        if retry.any():
+            ts[retry] = pd.to_datetime(raw[retry].astype(str).str.strip(), utc=True, errors="coerce",
+                                       format="ISO8601")
+    frame = chunk[sensors].apply(pd.to_numeric, errors="coerce")
+    # strip each distinct ID once rather than every reading's
+    ids = chunk[ID_COL].astype(str).astype("category")
+    stripped = ids.cat.categories.str.strip()
+    if stripped.is_unique:
+        frame[ID_COL] = ids.cat.rename_categories(stripped)
+    else:
+        frame[ID_COL] = ids.astype(str).str.strip()
+    frame[DAY_COL] = ts.dt.floor("D").dt.tz_localize(None)
+    valid = frame[DAY_COL].notna()
+    frame = frame[valid]
+    daily = frame.groupby([ID_COL, DAY_COL], sort=False, observed=True)[sensors].agg(list(_AGGS))
+    daily.columns = [f"{s}_{agg}" for s, agg in daily.columns]
+    daily.index = pd.MultiIndex.from_arrays(
+        [daily.index.get_level_values(ID_COL).astype(str), daily.index.get_level_values(DAY_COL)],
+        names=[ID_COL, DAY_COL])
+    return daily, int((~valid).sum())
+
+
+def _merge(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    """Combine per-(ID, Day) partial aggregates from several chunks or appends."""
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts)
+    how = {c: ("max" if c.endswith("_max") else "sum") for c in combined.columns}
+    return combined.groupby(level=[ID_COL, DAY_COL], sort=False).agg(how)
+
+
+def aggregate_readings(source: "bytes | str", chunk_rows: int = READING_CHUNK_ROWS) -> tuple[pd.DataFrame, int, int]:
+    """Reduce raw readings (CSV bytes or a file path) to daily aggregates.
+
+    Returns (daily, readings, bad_timestamps) where `daily` is indexed by
+    (ID, Day) with sum/count/max columns for every sensor in SENSOR_READINGS
+    (count 0 for sensors the upload did not include). Timestamps are ISO 8601
+    (offsets are converted to UTC, days are UTC days) or Unix seconds.
+    """
+    try:
+        header = [str(c).strip() for c in pd.read_csv(_open(source), nrows=0).columns]
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise CSVParseError(str(e)) from e
+    missing = [c for c in (ID_COL, TIMESTAMP_COL) if c not in header]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+    sensors = [s for s in SENSOR_READINGS if s in header]
+    if not sensors:
+        raise ValueError(f"No sensor columns. Include any of: {', '.join(SENSOR_READINGS)}.")
+
+    wanted = {ID_COL, TIMESTAMP_COL, *sensors}
+    parts, readings, bad = [], 0, 0
+    try:
+        reader = pd.read_csv(_open(source), usecols=lambda c: str(c).strip() in wanted, skipinitialspace=True,
+                             dtype={ID_COL: str}, chunksize=chunk_rows)
+        for chunk in reader:
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            daily, invalid = _daily(chunk, sensors)
+            parts.append(daily)
+            readings += len(chunk)
+            bad += invalid
+            # partial aggregates are small next to the readings; fold them
+            # every few chunks so a huge upload never piles them up
+            if len(parts) >= 8:
+                parts = [_merge(parts)]
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise CSVParseError(str(e)) from e
+    daily = _merge(parts) if parts else pd.DataFrame(
+        columns=_columns(sensors),
+        index=pd.MultiIndex.from_arrays([pd.Index([], dtype=object), pd.DatetimeIndex([])], names=[ID_COL, DAY_COL]))
+    for s in SENSOR_READINGS:
+        if s not in sensors:
+            daily[f"{s}_sum"], daily[f"{s}_count"], daily[f"{s}_max"] = 0.0, 0, np.nan
+    return daily[_columns(SENSOR_READINGS)], readings, bad
+
+
+def sensor_features(daily: pd.DataFrame) -> pd.DataFrame:
+    """Per-animal features from daily aggregates, indexed by ID.
+
+    For each reading, the feature it maps to is the mean of its daily values
+    (daily total for "sum" readings, daily mean otherwise) and `<feature>_Max`
+    the highest daily total or single reading. `Sensor_Days` counts the days
+    with any reading.
+    """
+    ids = daily.index.get_level_values(ID_COL)
+    out = {}
+    for sensor, (feature, how) in SENSOR_READINGS.items():
+        count = daily[f"{sensor}_count"]
+        total = daily[f"{sensor}_sum"].where(count > 0)
+        value = total if how == "sum" else total / count
+        peak = value if how == "sum" else daily[f"{sensor}_max"]
+        out[feature] = value.groupby(ids).mean()
+        out[f"{feature}_Max"] = peak.groupby(ids).max()
+    out[DAYS_COL] = pd.Series(1, index=daily.index).groupby(ids).sum()
+    return pd.DataFrame(out)
+
+
+def apply_sensor_features(df: pd.DataFrame, features: pd.DataFrame) -> pd.DataFrame:
+    """Write sensor features into the herd table; animals or readings without data keep their values.
+
+    Animals without any readings get 0 `Sensor_Days`; their `<feature>_Max`
+    columns stay missing.
+    """
+    df = df.copy()
+    aligned = features.reindex(df[ID_COL].astype(str))
+    aligned[DAYS_COL] = aligned[DAYS_COL].fillna(0)
+    for col in features.columns:
+        new = aligned[col].to_numpy(dtype=float)
+        if col in df.columns:
+            df[col] = np.where(np.isnan(new), pd.to_numeric(df[col], errors="coerce"), new)
+        else:
+            df[col] = new
+    return df
+
+
+def ingest_readings(path: str, source: "bytes | str", window_days: int = SENSOR_WINDOW_DAYS,
+                    progress=None) -> dict:
+    """Fold new raw readings into a stored dataset's sensor state and features.
+
+    `path` is a dataset file (see utils.datasets); its daily state is kept in
+    a companion file. Only the new readings are parsed: their daily
+    aggregates are merged into the state, days outside the trailing window
+    are dropped, and the features are recomputed from what remains and
+    written back into the dataset, so /cluster?dataset_id= picks them up.
+    Readings for IDs that are not in the herd are skipped. Picklable, so it
+    can run in a worker process; `progress(stage, fraction)` as in the pipeline.
+    """
+    progress = progress or _no_progress
+    timer = StageTimer()
+    progress("aggregate", 0.0)
+    with timer.stage("aggregate"):
+        new, readings, bad = aggregate_readings(source)
+    progress("merge", 0.8)
+    with timer.stage("merge"):
+        meta = read_dataset_meta(path)
+        herd = read_dataset(path)
+        known = new.index.get_level_values(ID_COL).isin(herd[ID_COL].astype(str))
+        unknown_ids = int(new.index.get_level_values(ID_COL)[~known].nunique())
+        parts = [new[known]]
+        state_path = companion_path(path, SENSOR_STATE)
+        if os.path.exists(state_path):
+            parts.insert(0, read_dataset(state_path).set_index([ID_COL, DAY_COL]))
+        daily = _merge(parts)
+        days = daily.index.get_level_values(DAY_COL)
+        if len(daily):
+            cutoff = days.max() - pd.Timedelta(days=window_days)
+            stale = days <= cutoff
+            daily = daily[~stale]
+        else:
+            stale = np.zeros(0, dtype=bool)
+        features = sensor_features(daily)
+        herd = apply_sensor_features(herd, features)
+    progress("store", 0.9)
+    with timer.stage("store"):
+        days = daily.index.get_level_values(DAY_COL)
+        sensors = {
+            "window_days": window_days,
+            "first_day": days.min().date().isoformat() if len(daily) else None,
+            "last_day": days.max().date().isoformat() if len(daily) else None,
+            "animals": len(features),
+            "updated": time.time(),
+        }
+        write_dataset(daily.reset_index(), state_path, {"dataset_id": meta["dataset_id"], "kind": SENSOR_STATE})
+        write_dataset(herd, path, {**meta, "columns": [str(c) for c in herd.columns], "sensors": sensors})
+    return {
+        "readings": readings,
+        "bad_timestamps": bad,
+        "unknown_ids": unknown_ids,
+        "stale_animal_days": int(stale.sum()),
+        "sensors": sensors,
+        "timings": timer.stages,
+    }
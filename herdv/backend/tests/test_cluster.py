@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from scipy.cluster.hierarchy import fcluster, linkage
+
+from backend.models.cluster import weighted_ward_linkage
+
+
+@pytest.mark.parametrize("n", [2, 7, 60])
+def test_weighted_ward_matches_scipy_at_unit_weights(n):
+    X = np.random.default_rng(n).normal(size=(n, 3))
+    ours = weighted_ward_linkage(X, np.ones(n))
+    ref = linkage(X, "ward")
+    assert ours.shape == ref.shape
+    np.testing.assert_allclose(ours[:, 2], ref[:, 2])
+    np.testing.assert_array_equal(ours[:, 3], ref[:, 3])
+    for k in range(1, n + 1):
+        a = fcluster(ours, k, "maxclust")
+        b = fcluster(ref, k, "maxclust")
+        # same partition, whatever the cluster numbering
+        assert len(set(zip(a, b))) == len(set(a)) == len(set(b))
@@ -0,0 +1,17 @@
+import re
+
+from backend.utils.exports import PDFStream
+
+
+def test_pdf_xref_offsets_point_at_objects():
+    pdf = PDFStream()
+    data = pdf.start() + pdf.page(["Herd (report)", "a\\b — ok"]) + pdf.page(["second"]) + pdf.finish()
+    xref_at = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+    assert data[xref_at:].startswith(b"xref\n0 ")
+    size = int(re.search(rb"/Size (\d+)", data).group(1))
+    entries = data[xref_at:].split(b"\n")[2:2 + size]
+    assert entries[0] == b"0000000000 65535 f "
+    for num, entry in enumerate(entries[1:], start=1):
+        offset, _, kind = entry.split()
+        assert kind == b"n"
+        assert data[int(offset):].startswith(b"%d 0 obj\n" % num)
@@ -0,0 +1,74 @@
+import asyncio
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from backend.utils.ingest import ContentHasher, _RowCounter, scan_csv
+
+
+def _count(*chunks: bytes) -> int:
+    counter = _RowCounter()
+    for chunk in chunks:
+        counter.feed(chunk)
+    return counter.finish()
+
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.parametrize("sep", [b"\n", b"\r\n", b"\r"])
+def test_row_counter_line_endings(sep):
+    data = sep.join([b"a,b", b"1,2", b"3,4"]) + sep
+    assert _count(data) == 3
+    # every split point, including one between the halves of a CRLF
+    for i in range(1, len(data)):
+        assert _count(data[:i], data[i:]) == 3
+
+
+def test_row_counter_skips_blank_lines_and_quoted_newlines():
+    assert _count(b'a,b\n\n"x\r\ny",1\n  \n"say ""hi""\n",2') == 3
+
+
+def test_scan_csv_cr_only_matches_pandas():
+    data = b"ID,Milk\rA,1\rB,2\r"
+    columns, preview, rows = asyncio.run(scan_csv(_stream([data[:9], data[9:]])))
+    expected = pd.read_csv(BytesIO(data))
+    assert columns == list(expected.columns)
+    assert rows == len(expected) == 2
+    assert preview["ID"].tolist() == ["A", "B"]
+
+
+def test_scan_csv_preview_is_bounded():
+    data = b"ID,Milk\r" + b"".join(b"A%d,1\r" % i for i in range(10_000))
+    chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+    columns, preview, rows = asyncio.run(scan_csv(_stream(chunks), preview_rows=3, preview_max_bytes=4096))
+    assert rows == 10_000
+    assert len(preview) == 3
+
+    # fewer preview rows than asked for when they do not fit
+    columns, preview, rows = asyncio.run(scan_csv(_stream(chunks), preview_rows=5000, preview_max_bytes=200))
+    assert rows == 10_000
+    assert 0 < len(preview) < 40
+
+
+def _digest(*chunks: bytes) -> str:
+    hasher = ContentHasher()
+    for chunk in chunks:
+        hasher.feed(chunk)
+    return hasher.hexdigest()
+
+
+def test_content_hasher_ignores_bom_crlf_and_trailing_newlines():
+    plain = b"ID,Milk\nA,1\nB,2"
+    expected = _digest(plain)
+    for variant in [plain + b"\n", plain + b"\n\n", b"\xef\xbb\xbf" + plain,
+                    b"\xef\xbb\xbf" + plain.replace(b"\n", b"\r\n") + b"\r\n"]:
+        assert _digest(variant) == expected
+        # every split point, including inside the BOM and between CR and LF
+        for i in range(1, len(variant)):
+            assert _digest(variant[:i], variant[i:]) == expected
+    assert _digest(plain + b"\nC,3") != expected
+    assert _digest(plain.replace(b"\n", b"\n\n")) != expected
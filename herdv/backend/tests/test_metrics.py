@@ -0,0 +1,13 @@
+from backend.utils.metrics import Counter, Histogram
+
+
+def test_large_values_keep_every_digit():
+    counter = Counter("t_total", "test", ("endpoint",))
+    counter.inc("/x", value=195_678_123)
+    assert counter.expose()[-1] == 't_total{endpoint="/x"} 195678123.0'
+
+    histogram = Histogram("t_bytes", "test", buckets=(1024,))
+    histogram.observe(value=123_456_789)
+    histogram.observe(value=1)
+    assert "t_bytes_sum 123456790.0" in histogram.expose()
+    assert 't_bytes_bucket{le="1024"} 1' in histogram.expose()
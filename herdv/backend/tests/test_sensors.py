@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+
+from backend.bench.synth import make_herd
+from backend.models import sensors
+from backend.models.pipeline import cluster_dataframe
+from backend.utils import responses
+from backend.utils.schema import ID_COL
+
+
+def _readings(ids) -> pd.DataFrame:
+    return pd.DataFrame({
+        ID_COL: list(ids) * 2,
+        "Timestamp": ["2026-10-01T06:00:00Z"] * len(ids) + ["2026-10-02T06:00:00Z"] * len(ids),
+        "Ear_Temperature_C": [38.6] * (2 * len(ids)),
+    })
+
+
+def test_animals_without_readings_get_zero_sensor_days():
+    herd = make_herd(40, seed=1)
+    daily, _, _ = sensors.aggregate_readings(_readings(herd[ID_COL][:10]).to_csv(index=False).encode())
+    out = sensors.apply_sensor_features(herd, sensors.sensor_features(daily))
+    assert out[sensors.DAYS_COL].tolist() == [2] * 10 + [0] * 30
+    assert out["Ear_Temperature_C_Max"].isna().sum() == 30
+
+
+def test_cluster_response_encodes_with_stdlib_json(monkeypatch):
+    # a cluster with no sensor readings at all has missing sensor means
+    herd = make_herd(60, seed=2)
+    daily, _, _ = sensors.aggregate_readings(_readings(herd[ID_COL][:3]).to_csv(index=False).encode())
+    herd = sensors.apply_sensor_features(herd, sensors.sensor_features(daily))
+    run = cluster_dataframe(herd, n_clusters=4)
+    monkeypatch.setattr(responses, "orjson", None)
+    body = json.loads(responses.encode_json(responses.cluster_response("r", run, responses.SECTIONS)))
+    maxima = [c["means"]["Ear_Temperature_C_Max"] for c in body["clusters"]]
+    assert None in maxima
+    assert all(c["means"][sensors.DAYS_COL] is not None for c in body["clusters"])
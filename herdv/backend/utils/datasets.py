@@ -0,0 +1,156 @@
+# backend/utils/datasets.py
+import json
+import os
+import pickle
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+from backend.utils.ingest import HAVE_PYARROW
+from backend.utils.store import is_hex_id
+
+# Where uploaded herds are kept, parsed and typed, between requests. Point all
+# workers at the same directory so any of them can serve any dataset_id.
+DATASET_DIR = os.environ.get("HERDV_DATASET_DIR") or os.path.join(tempfile.gettempdir(), "herdv-datasets")
+DATASET_TTL_SECONDS = float(os.environ.get("HERDV_DATASET_TTL_SECONDS", str(7 * 24 * 3600)))
+# Feather (Arrow IPC, uncompressed) is memory-mapped on read; without pyarrow
+# datasets fall back to pickles, which still skip CSV parsing
+DATASET_FORMAT = "feather" if HAVE_PYARROW else "pickle"
+_SUFFIX = {"feather": ".arrow", "pickle": ".pkl"}
+_META_KEY = b"herdv"
+
+
+def write_dataset(df: pd.DataFrame, path: str, meta: dict):
+    """Write a frame atomically as uncompressed Feather (or a pickle without pyarrow)."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if path.endswith(_SUFFIX["feather"]):
+                import pyarrow as pa
+
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                schema_meta = dict(table.schema.metadata or {})
+                schema_meta[_META_KEY] = json.dumps(meta).encode()
+                table = table.replace_schema_metadata(schema_meta)
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+            else:
+                pickle.dump((meta, df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def read_dataset(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Load a stored dataset; Feather files are memory-mapped and only `columns` are read."""
+    if path.endswith(_SUFFIX["feather"]):
+        import pyarrow as pa
+
+        # Not closed explicitly: zero-copy columns may still point into the map,
+        # which stays alive as long as they do
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+    with open(path, "rb") as f:
+        _, df = pickle.load(f)
+    return df if columns is None else df[columns]
+
+
+def companion_path(path: str, kind: str) -> str:
+    """Path of a file kept alongside a dataset (same ID and format), e.g. sensor state."""
+    base, suffix = os.path.splitext(path)
+    return f"{base}.{kind}{suffix}"
+
+
+def read_dataset_meta(path: str) -> dict:
+    if path.endswith(_SUFFIX["feather"]):
+        import pyarrow as pa
+
+        with pa.memory_map(path, "r") as source:
+            schema = pa.ipc.open_file(source).schema
+        return json.loads(schema.metadata[_META_KEY])
+    with open(path, "rb") as f:
+        meta, _ = pickle.load(f)
+    return meta
+
+
+class DatasetStore:
+    """Upload-once registry of parsed herds stored as columnar files on disk.
+
+    Datasets live only on disk (nothing is held in memory between requests)
+    and expire `ttl_seconds` after upload.
+    """
+
+    def __init__(self, directory: str = DATASET_DIR, ttl_seconds: float = DATASET_TTL_SECONDS,
+                 fmt: str = DATASET_FORMAT):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.fmt = fmt
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, df: pd.DataFrame) -> dict:
+        """Store a typed frame and return its metadata, including the new dataset_id."""
+        dataset_id = uuid.uuid4().hex
+        meta = {"dataset_id": dataset_id, "rows": len(df), "columns": [str(c) for c in df.columns],
+                "format": self.fmt, "created": time.time()}
+        path = os.path.join(self.directory, dataset_id + _SUFFIX[self.fmt])
+        write_dataset(df, path, meta)
+        self._sweep()
+        return {**meta, "bytes": os.path.getsize(path)}
+
+    def path(self, dataset_id: str) -> str | None:
+        """Path of a live dataset, or None if it is unknown or expired."""
+        if not is_hex_id(dataset_id):
+            return None
+        for suffix in _SUFFIX.values():
+            path = os.path.join(self.directory, dataset_id + suffix)
+            try:
+                if time.time() - os.path.getmtime(path) <= self.ttl_seconds:
+                    return path
+            except OSError:
+                continue
+        return None
+
+    def info(self, dataset_id: str) -> dict | None:
+        path = self.path(dataset_id)
+        if path is None:
+            return None
+        return {**read_dataset_meta(path), "bytes": os.path.getsize(path)}
+
+    def delete(self, dataset_id: str) -> bool:
+        path = self.path(dataset_id)
+        if path is None:
+            return False
+        try:
+            os.unlink(path)
+        except OSError:
+            return False
+        # and anything kept alongside it (see companion_path)
+        for name in os.listdir(self.directory):
+            if name.startswith(dataset_id + "."):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        return True
+
+    def _sweep(self):
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(tuple(_SUFFIX.values())):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.unlink(path)
+            except OSError:
+                pass
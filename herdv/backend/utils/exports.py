@@ -0,0 +1,218 @@
+# backend/utils/exports.py
+import os
+import textwrap
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from backend.models.recommend import RULES, evaluate_rules
+
+# Rows per CSV chunk / lines per PDF page in streamed exports
+EXPORT_CHUNK_ROWS = int(os.environ.get("HERDV_EXPORT_CHUNK_ROWS", "5000"))
+PDF_LINES_PER_PAGE = 64
+REPORT_FORMATS = ("csv", "pdf")
+# Per-animal columns in the PDF report: (column, header, width, decimals)
+REPORT_PDF_COLUMNS = [
+    ("ID", "ID", 12, None), ("Breed", "Breed", 10, None), ("Milk_Yield", "Milk", 7, 1),
+    ("Weight_kg", "Weight", 7, 0), ("Fertility_Score", "Fert", 6, 1), ("Parasite_Load_Index", "Parasite", 9, 0),
+    ("Ear_Temperature_C", "EarTemp", 8, 1), ("Respiration_Rate_BPM", "Resp", 6, 0),
+]
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yield a frame as UTF-8 CSV, header first, `chunk_rows` rows per chunk."""
+    yield df.iloc[:0].to_csv(index=False).encode("utf-8")
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode("utf-8")
+
+
+def recommendations_frame(means: pd.DataFrame, recs: dict[int, dict]) -> pd.DataFrame:
+    """One row per cluster: Cluster, Name, Recommendation, then the feature means."""
+    out = pd.DataFrame({
+        "Cluster": means["Cluster"].astype(int),
+        "Name": [recs[int(c)]["name"] for c in means["Cluster"]],
+        "Recommendation": [recs[int(c)]["recommendation"] for c in means["Cluster"]],
+    })
+    return pd.concat([out, means.drop(columns="Cluster").astype(float)], axis=1)
+
+
+def recommendations_pdf(rows: pd.DataFrame, images: list[bytes] | None = None) -> bytes:
+    """Cluster recommendations as a PDF, built in memory.
+
+    Each of `images` (PNG bytes, e.g. the distribution grid) gets a page of
+    its own after the recommendations, scaled to fit.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    width, height = letter
+    y = height - 50
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y, "HERD-V Cluster Recommendations")
+    y -= 30
+    c.setFont("Helvetica", 10)
+    for r in rows.itertuples(index=False):
+        text = f"Cluster {r.Cluster} - {r.Name}: {r.Recommendation}"
+        c.drawString(50, y, text)
+        y -= 14
+        if y < 80:
+            c.showPage()
+            y = height - 50
+    for png in images or []:
+        c.showPage()
+        image = ImageReader(BytesIO(png))
+        w, h = image.getSize()
+        scale = min((width - 80) / w, (height - 80) / h)
+        c.drawImage(image, 40, height - 40 - h * scale, w * scale, h * scale)
+    c.save()
+    return buf.getvalue()
+
+
+# ---------------- Per-animal report ----------------
+
+def _report_order(df_labeled: pd.DataFrame, clusters: list[int] | None) -> np.ndarray:
+    labels = df_labeled["Cluster"].to_numpy()
+    order = np.argsort(labels, kind="stable")
+    if clusters is not None:
+        order = order[np.isin(labels[order], clusters)]
+    return order
+
+
+def iter_report_csv(df_labeled: pd.DataFrame, names: dict[int, str], clusters: list[int] | None = None,
+                    chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Per-animal report as CSV chunks, grouped by cluster.
+
+    Each row is an animal's measurements plus its cluster name and one
+    column per recommendation rule it triggers (relative to the whole herd).
+    """
+    flags = evaluate_rules(df_labeled)
+    order = _report_order(df_labeled, clusters)
+    header = True
+    for start in range(0, max(len(order), 1), chunk_rows):
+        rows = order[start:start + chunk_rows]
+        chunk = df_labeled.iloc[rows]
+        chunk = pd.concat([
+            chunk[["Cluster"]].reset_index(drop=True),
+            chunk["Cluster"].map(names).rename("Cluster_Name").reset_index(drop=True),
+            chunk.drop(columns="Cluster").reset_index(drop=True),
+            flags.iloc[rows].reset_index(drop=True),
+        ], axis=1)
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+class PDFStream:
+    """Minimal streaming PDF writer for pages of monospaced text.
+
+    Each page is written out as soon as it is complete; only the byte offsets
+    of the objects are kept, so memory stays flat however many pages there
+    are. Object 1 is the catalog, 2 the page tree (written last), 3 the font.
+    """
+
+    def __init__(self, width: int = 612, height: int = 792, font_size: float = 8.0, margin: int = 36):
+        self.width, self.height = width, height
+        self.font_size, self.margin = font_size, margin
+        self._offsets: dict[int, int] = {}
+        self._pages: list[int] = []
+        self._next_id = 4
+        self._pos = 0
+
+    def _obj(self, num: int, body: bytes) -> bytes:
+        self._offsets[num] = self._pos
+        data = b"%d 0 obj\n" % num + body + b"\nendobj\n"
+        self._pos += len(data)
+        return data
+
+    def start(self) -> bytes:
+        head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._pos = len(head)
+        return (head
+                + self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+                + self._obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"))
+
+    @staticmethod
+    def _escape(line: str) -> bytes:
+        line = line.replace("‑", "-").replace("–", "-").replace("—", "-")
+        raw = line.encode("cp1252", "replace")
+        return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def page(self, lines: list[str]) -> bytes:
+        leading = self.font_size * 1.2
+        ops = [b"BT /F1 %.1f Tf %.1f TL %d %d Td" % (self.font_size, leading, self.margin,
+                                                    self.height - self.margin)]
+        ops += [b"(" + self._escape(line) + b") Tj T*" for line in lines]
+        ops.append(b"ET")
+        content = b"\n".join(ops)
+        content_id, page_id = self._next_id, self._next_id + 1
+        self._next_id += 2
+        self._pages.append(page_id)
+        return (self._obj(content_id, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+                + self._obj(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                                     b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                            % (self.width, self.height, content_id)))
+
+    def finish(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % p for p in self._pages)
+        data = self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)))
+        xref_at = self._pos
+        size = self._next_id
+        entries = [b"0000000000 65535 f \n"]
+        entries += [b"%010d 00000 n \n" % self._offsets[i] if i in self._offsets else b"0000000000 65535 f \n"
+                    for i in range(1, size)]
+        return (data + b"xref\n0 %d\n" % size + b"".join(entries)
+                + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at))
+
+
+def _format_cell(value, width: int, decimals: int | None) -> str:
+    if decimals is not None:
+        text = "-" if pd.isna(value) else f"{value:.{decimals}f}"
+        return text.rjust(width)[:width]
+    return str(value).ljust(width)[:width]
+
+
+def iter_report_pdf(df_labeled: pd.DataFrame, names: dict[int, str], recommendations: dict[int, str],
+                    clusters: list[int] | None = None, lines_per_page: int = PDF_LINES_PER_PAGE):
+    """Per-animal report as a PDF streamed page by page, one section per cluster.
+
+    Each cluster section starts with its name, size and recommendation,
+    followed by one line per animal with key measurements and the codes of
+    the rules it triggers.
+    """
+    flags = evaluate_rules(df_labeled).to_numpy()
+    codes = np.array([r["key"] for r in RULES])
+    columns = [c for c in REPORT_PDF_COLUMNS if c[0] in df_labeled.columns]
+    table_header = " ".join(h.ljust(w) if d is None else h.rjust(w) for _, h, w, d in columns) + "  Alerts"
+    labels = df_labeled["Cluster"].to_numpy()
+    order = _report_order(df_labeled, clusters)
+
+    pdf = PDFStream()
+    yield pdf.start()
+    lines: list[str] = ["HERD-V Per-Animal Report", ""]
+    current = None
+    for start in range(0, len(order), EXPORT_CHUNK_ROWS):
+        rows = order[start:start + EXPORT_CHUNK_ROWS]
+        chunk = df_labeled.iloc[rows]
+        values = [chunk[col].to_numpy() for col, _, _, _ in columns]
+        for i, row in enumerate(rows):
+            cluster = int(labels[row])
+            if cluster != current:
+                current = cluster
+                count = int((labels == cluster).sum())
+                section = ["", f"Cluster {cluster} - {names.get(cluster, '')} ({count} animals)"]
+                section += ["  " + part for part in textwrap.wrap(recommendations.get(cluster, ""), 90)]
+                section += ["", table_header, "-" * len(table_header)]
+                if len(lines) + len(section) + 1 > lines_per_page:
+                    yield pdf.page(lines)
+                    lines = []
+                lines += section
+            cells = [_format_cell(v[i], w, d) for v, (_, _, w, d) in zip(values, columns)]
+            lines.append(" ".join(cells) + "  " + ",".join(codes[flags[row]]))
+            if len(lines) >= lines_per_page:
+                yield pdf.page(lines)
+                lines = [table_header, "-" * len(table_header)]
+    yield pdf.page(lines)
+    yield pdf.finish()
@@ -0,0 +1,299 @@
+# backend/utils/ingest.py
+import hashlib
+import importlib.util
+import os
+import tempfile
+from io import BytesIO
+
+import pandas as pd
+
+# optional: multi-threaded parser. Only probed here; pandas imports it on
+# the first parse that uses it.
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+# Arrow only beats the C parser when it has threads to spread the work over;
+# on a single CPU it is slower, so it is the default on multi-core hosts only
+USE_PYARROW = HAVE_PYARROW and (os.cpu_count() or 1) > 1
+
+
+# Uploads larger than this are rejected (413) while they stream in
+MAX_UPLOAD_BYTES = int(os.environ.get("HERDV_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+# Uploads are buffered in memory up to this size and in a temp file beyond it
+SPOOL_MEMORY_BYTES = int(os.environ.get("HERDV_SPOOL_MEMORY_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Rows per incremental parse step for uploads that were spooled to disk
+PARSE_CHUNK_ROWS = 50_000
+# Most of an upload /schema/validate keeps for parsing the header and preview
+PREVIEW_MAX_BYTES = 1024 * 1024
+
+
+class CSVParseError(ValueError):
+    """Raised when uploaded bytes cannot be parsed as CSV."""
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+def _parse(content: bytes, engine: str) -> pd.DataFrame:
+    if engine == "pyarrow":
+        # Arrow accepts padded numbers on its own; string cells are stripped below
+        return pd.read_csv(BytesIO(content), engine="pyarrow")
+    # Use skipinitialspace to handle cases like '7. 0' where an extra space follows a comma
+    return pd.read_csv(BytesIO(content), skipinitialspace=True)
+
+
+def _pick_engine(content: bytes) -> str:
+    # skipinitialspace also lets a quoted field start after the space
+    # (`a, "x,y"`); Arrow would split that field, so leave it to the C parser
+    if USE_PYARROW and b', "' not in content:
+        return "pyarrow"
+    return "c"
+
+
+def read_csv_bytes(content: bytes, engine: str | None = None) -> pd.DataFrame:
+    """Read CSV bytes into a DataFrame with robust cleaning.
+
+    - skipinitialspace to handle spaces after delimiters
+    - strip column names
+    - strip whitespace from string cells
+
+    Uses the pyarrow engine when it is installed and the host has more than
+    one CPU, and the C engine otherwise; both produce the same frame.
+    """
+    engine = engine or _pick_engine(content)
+    try:
+        df = _parse(content, engine)
+    except Exception as e:
+        if engine == "pyarrow":
+            # Arrow rejects short rows, blank lines and the like that the C
+            # parser accepts; only the C parser's verdict is final
+            return read_csv_bytes(content, engine="c")
+        raise CSVParseError(str(e)) from e
+    return _clean_frame(df)
+
+
+def _clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Normalize column names
+    df.columns = [str(c).strip() for c in df.columns]
+    # Trim whitespace from string columns; missing cells read as "nan", as they
+    # always have, whichever engine left them as NaN or None
+    for col in df.select_dtypes(include=[object]).columns:
+        s = df[col]
+        cleaned = s.astype(str).str.strip()
+        missing = s.isna()
+        if missing.any():
+            cleaned = cleaned.where(~missing, "nan")
+        df[col] = cleaned
+    return df
+
+
+def read_csv_file(path: str, chunk_rows: int = PARSE_CHUNK_ROWS) -> pd.DataFrame:
+    """Parse a CSV file incrementally, cleaning each chunk as it is read.
+
+    Only one chunk of raw parser state is alive at a time, so peak memory
+    stays close to the size of the final frame.
+    """
+    try:
+        reader = pd.read_csv(path, skipinitialspace=True, chunksize=chunk_rows)
+        chunks = [_clean_frame(chunk) for chunk in reader]
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise CSVParseError(str(e)) from e
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks, ignore_index=True, copy=False)
+    del chunks
+    # A chunk whose string column was all blank came back as float NaN
+    for col in df.select_dtypes(include=[object]).columns:
+        if df[col].isna().any():
+            df[col] = df[col].where(df[col].notna(), "nan")
+    return df
+
+
+def read_csv(source: "bytes | str") -> pd.DataFrame:
+    """Read CSV from in-memory bytes or from a spooled upload's file path."""
+    if isinstance(source, bytes):
+        return read_csv_bytes(source)
+    return read_csv_file(source)
+
+
+# ---------------- Streaming uploads ----------------
+
+class SpooledUpload:
+    """Request body kept in memory while small and in a temp file once large.
+
+    `source` is what the parsers take: the bytes, or the temp file's path
+    (which a worker process can open without the body being pickled).
+    `digest` is the ContentHasher digest of the body.
+    """
+
+    def __init__(self, data: bytes | None, path: str | None, size: int, digest: str | None = None):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+    @property
+    def source(self) -> "bytes | str":
+        return self.data if self.path is None else self.path
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+class ContentHasher:
+    """Hash of a CSV body that ignores differences clients introduce on resend.
+
+    A leading UTF-8 BOM, CRLF line endings and trailing newlines do not
+    change the digest. Fed chunk by chunk, so it works on streamed uploads.
+    """
+
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=20)
+        self._pending = b""
+        self._started = False
+
+    def feed(self, chunk: bytes):
+        data = self._pending + chunk
+        if not self._started:
+            if len(data) < 3 and b"\xef\xbb\xbf".startswith(data):
+                self._pending = data
+                return
+            self._started = True
+            if data.startswith(b"\xef\xbb\xbf"):
+                data = data[3:]
+        data = data.replace(b"\r\n", b"\n")
+        # hold back a final run of line breaks (and a \r that may start a
+        # CRLF split across chunks) until more content follows
+        body = data.rstrip(b"\r\n")
+        self._pending = data[len(body):]
+        self._hash.update(body)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+async def iter_upload(request, file=None, chunk_bytes: int = UPLOAD_CHUNK_BYTES):
+    """Yield the CSV body chunk by chunk from a multipart file or the raw request body."""
+    if file is not None:
+        while True:
+            chunk = await file.read(chunk_bytes)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in request.stream():
+            if chunk:
+                yield chunk
+
+
+async def spool_upload(chunks, max_bytes: int = MAX_UPLOAD_BYTES,
+                       memory_bytes: int = SPOOL_MEMORY_BYTES) -> SpooledUpload:
+    """Consume an async chunk iterator into a SpooledUpload, enforcing `max_bytes`."""
+    buf = BytesIO()
+    f = None
+    size = 0
+    hasher = ContentHasher()
+    try:
+        async for chunk in chunks:
+            hasher.feed(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit.")
+            if f is None and size > memory_bytes:
+                f = tempfile.NamedTemporaryFile(prefix="herdv-upload-", suffix=".csv", delete=False)
+                f.write(buf.getbuffer())
+                buf = None
+            (f or buf).write(chunk)
+    except BaseException:
+        if f is not None:
+            f.close()
+            os.unlink(f.name)
+        raise
+    if f is None:
+        return SpooledUpload(buf.getvalue(), None, size, hasher.hexdigest())
+    f.close()
+    return SpooledUpload(None, f.name, size, hasher.hexdigest())
+
+
+class _RowCounter:
+    """Counts non-blank CSV records in a byte stream without parsing fields.
+
+    CRLF, LF and a lone CR all end a line, as they do for the parsers.
+    Newlines inside double-quoted fields do not end a record.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.in_quotes = False
+        self.line_has_content = False
+        self._cr = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Count the records in `chunk`; returns it with every line break as LF."""
+        if self._cr and chunk.startswith(b"\n"):
+            chunk = chunk[1:]  # second half of a CRLF split across chunks
+        if chunk:
+            self._cr = chunk.endswith(b"\r")
+        chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        for i, part in enumerate(chunk.split(b'"')):
+            if i > 0:
+                # every quote character flips the state ("" escapes flip twice)
+                self.in_quotes = not self.in_quotes
+                self.line_has_content = True
+            if self.in_quotes or not part:
+                continue
+            lines = part.split(b"\n")
+            for line in lines[:-1]:
+                if self.line_has_content or line.strip():
+                    self.rows += 1
+                self.line_has_content = False
+            if lines[-1].strip():
+                self.line_has_content = True
+        return chunk
+
+    def finish(self) -> int:
+        return self.rows + (1 if self.line_has_content else 0)
+
+
+async def scan_csv(chunks, preview_rows: int = 10, max_bytes: int = MAX_UPLOAD_BYTES,
+                   preview_max_bytes: int = PREVIEW_MAX_BYTES):
+    """Return (columns, preview_frame, row_count) for a streamed CSV.
+
+    Only the header and the first `preview_rows` records are parsed (fewer
+    if they do not fit in `preview_max_bytes`); the rest of the stream is
+    just counted, so cost is bounded regardless of size.
+    """
+    head = bytearray()
+    counter = _RowCounter()
+    size = 0
+    preview_done = False
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit.")
+        chunk = counter.feed(chunk)
+        if not preview_done:
+            head += chunk[:preview_max_bytes - len(head)]
+            # header + preview rows, with one spare line for a record split across chunks
+            preview_done = head.count(b"\n") > preview_rows + 1 or len(head) >= preview_max_bytes
+    rows = max(counter.finish() - 1, 0)
+    if not head.strip():
+        raise CSVParseError("No columns to parse from file")
+    # Parse just the header and preview lines, not the rest of the first chunk
+    cut = len(head)
+    if preview_done:
+        cut = 0
+        for _ in range(preview_rows + 1):
+            end = head.find(b"\n", cut)
+            if end < 0:
+                break
+            cut = end + 1
+        if cut == 0:
+            raise CSVParseError(f"Header line is longer than {preview_max_bytes} bytes.")
+    df = read_csv_bytes(bytes(head[:cut]))
+    return list(df.columns), df.head(preview_rows), rows
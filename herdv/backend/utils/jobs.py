@@ -0,0 +1,186 @@
+# backend/utils/jobs.py
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+# Worker processes for CPU-bound jobs, and how many jobs may wait beyond them
+JOB_WORKERS = int(os.environ.get("HERDV_JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+JOB_QUEUE_DEPTH = int(os.environ.get("HERDV_JOB_QUEUE_DEPTH", "16"))
+# Finished jobs kept around for status/result polling
+JOB_HISTORY = int(os.environ.get("HERDV_JOB_HISTORY", "256"))
+
+# Set in each worker process by the pool initializer
+_progress_queue = None
+
+
+class QueueFull(RuntimeError):
+    """Raised when the pool already has its maximum of running and queued jobs."""
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _report(job_id: str, stage: str, fraction: float):
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, stage, float(fraction)))
+
+
+def _run_in_worker(job_id: str, fn, args, kwargs):
+    return fn(*args, progress=partial(_report, job_id), **kwargs)
+
+
+class JobManager:
+    """Process pool for CPU-bound work with a bounded queue and job tracking.
+
+    Submitted functions must be picklable module-level callables accepting a
+    `progress(stage, fraction)` keyword; progress reported from the worker is
+    relayed back over a queue and exposed through `status()`.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, queue_depth: int = JOB_QUEUE_DEPTH,
+                 history: int = JOB_HISTORY):
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.history = history
+        self._executor = None
+        self._queue = None
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created lazily so importing the app (or a worker) never forks
+        if self._executor is None:
+            # spawn: uvicorn and the relay thread make fork unsafe
+            ctx = multiprocessing.get_context("spawn")
+            self._queue = ctx.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=ctx,
+                initializer=_init_worker, initargs=(self._queue,),
+            )
+            threading.Thread(target=self._relay_progress, args=(self._queue,), daemon=True).start()
+        return self._executor
+
+    def _relay_progress(self, queue):
+        while True:
+            msg = queue.get()
+            if msg is None:
+                queue.close()
+                return
+            job_id, stage, fraction = msg
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job["status"] in ("queued", "running"):
+                    job.update(status="running", stage=stage, progress=fraction)
+
+    def submit(self, fn, *args, on_done=None, cleanup=None, **kwargs) -> str:
+        """Queue `fn(*args, **kwargs)` and return its job ID.
+
+        `on_done(result)` runs in the parent once the job succeeds and its
+        return value becomes the job's stored result. `cleanup()` runs in the
+        parent once the job has finished either way; if `submit` itself
+        raises, cleaning up stays with the caller.
+        """
+        with self._lock:
+            if self._active >= self.max_workers + self.queue_depth:
+                raise QueueFull("Job queue is full, retry later.")
+            self._active += 1
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id, "status": "queued", "stage": None, "progress": 0.0,
+                "error": None, "created": time.time(), "finished": None,
+                "result": None, "future": None,
+            }
+            self._trim()
+        try:
+            pool = self._pool()
+            future = pool.submit(_run_in_worker, job_id, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+                self._jobs.pop(job_id, None)
+            raise
+        with self._lock:
+            self._jobs[job_id]["future"] = future
+        future.add_done_callback(partial(self._finish, job_id, on_done, cleanup, pool))
+        return job_id
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """Shut down `executor` and its progress relay, unless it was already replaced."""
+        with self._lock:
+            if executor is not self._executor:
+                return
+            queue, self._executor, self._queue = self._queue, None, None
+        executor.shutdown(wait=False, cancel_futures=True)
+        queue.put(None)  # the relay thread closes the queue once it reads this
+
+    def _finish(self, job_id: str, on_done, cleanup, executor, future):
+        update = {"finished": time.time()}
+        if cleanup is not None:
+            cleanup()
+        try:
+            result = future.result()
+            if on_done is not None:
+                result = on_done(result)
+            update.update(status="done", progress=1.0, stage="done", result=result)
+        except Exception as e:
+            update.update(status="failed", error=f"{type(e).__name__}: {e}")
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. OOM-killed); start a fresh pool next time
+                self._retire(executor)
+        with self._lock:
+            self._active -= 1
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(update)
+
+    def _trim(self):
+        finished = [j for j, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k not in ("result", "future")}
+
+    def result(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job["result"]
+
+    async def run(self, fn, *args, **kwargs):
+        """Submit a job and wait for it without blocking the event loop."""
+        job_id = self.submit(fn, *args, **kwargs)
+        with self._lock:
+            future = self._jobs[job_id]["future"]
+        # Raises the worker's own exception if the job failed. The pool runs
+        # _finish before this wakes up, so the job record is already final.
+        try:
+            await asyncio.wrap_future(future)
+        finally:
+            # nobody polls jobs run this way; never leave their record behind
+            with self._lock:
+                job = self._jobs.pop(job_id, None)
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+        return job["result"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.max_workers, "queue_depth": self.queue_depth, "active": self._active}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._retire(self._executor)
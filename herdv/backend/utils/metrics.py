@@ -0,0 +1,232 @@
+# backend/utils/metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:  # not available on Windows; memory high-water marks are skipped there
+    import resource
+except ImportError:
+    resource = None
+
+# HERDV_METRICS=0 turns off the middleware, Server-Timing headers and /metrics
+METRICS_ENABLED = os.environ.get("HERDV_METRICS", "1") != "0"
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (10, 100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+# Key in the ASGI scope where endpoints leave stage timings and row counts
+SCOPE_KEY = "herdv.metrics"
+
+
+class StageTimer:
+    """Accumulates wall time per named stage; cheap enough to leave on."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    # repr keeps every digit; %g would round large counters to 6 significant digits
+    return repr(float(value))
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for labels, value in items for line in self._lines(labels, value)]
+        return lines
+
+    def _lines(self, labels: tuple, value) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _lines(self, labels: tuple, value) -> list[str]:
+        counts, total, n = value
+        names = self.labelnames + ("le",)
+        lines, cumulative = [], 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("herdv_request_duration_seconds", "Request latency by endpoint.",
+                            ("endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("herdv_stage_duration_seconds", "Pipeline stage latency by endpoint.",
+                          ("endpoint", "stage"))
+REQUEST_ROWS = Histogram("herdv_request_rows", "Animals processed per request.", ("endpoint",), ROW_BUCKETS)
+REQUEST_BYTES = Histogram("herdv_request_bytes", "Request body size.", ("endpoint",), BYTE_BUCKETS)
+RESPONSE_BYTES = Histogram("herdv_response_bytes", "Response body size.", ("endpoint",), BYTE_BUCKETS)
+MEMORY_PEAK = Gauge("herdv_memory_peak_bytes", "Process peak RSS so far.")
+# ru_maxrss only ever grows: a request is charged the growth it caused, if any
+# (concurrent requests may share the blame)
+MEMORY_PEAK_GROWTH = Counter("herdv_memory_peak_growth_bytes_total",
+                             "Growth of the process peak RSS during requests, by endpoint.", ("endpoint",))
+CACHE_LOOKUPS = Counter("herdv_cache_lookups_total", "Cache lookups by cache and result (hit or miss).",
+                        ("cache", "result"))
+CACHE_ENTRIES = Gauge("herdv_cache_entries", "Entries held per cache.", ("cache",))
+CACHE_BYTES = Gauge("herdv_cache_bytes", "Estimated bytes held per cache.", ("cache",))
+JOBS_ACTIVE = Gauge("herdv_jobs_active", "Worker-pool jobs queued or running.")
+JOBS_CAPACITY = Gauge("herdv_jobs_capacity", "Jobs the worker pool admits before rejecting new ones.")
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, REQUEST_ROWS, REQUEST_BYTES, RESPONSE_BYTES, MEMORY_PEAK,
+            MEMORY_PEAK_GROWTH, CACHE_LOOKUPS, CACHE_ENTRIES, CACHE_BYTES, JOBS_ACTIVE, JOBS_CAPACITY]
+
+
+def _peak_rss() -> int | None:
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def expose() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.expose()) + "\n"
+
+
+def record(request, timings: dict[str, float] | None = None, rows: int | None = None):
+    """Attach stage timings (seconds) and a row count to the current request.
+
+    Picked up by MetricsMiddleware for the Server-Timing header and /metrics.
+    """
+    if not METRICS_ENABLED:
+        return
+    info = request.scope.setdefault(SCOPE_KEY, {"timings": {}, "rows": None})
+    if timings:
+        for stage, seconds in timings.items():
+            info["timings"][stage] = info["timings"].get(stage, 0.0) + seconds
+    if rows is not None:
+        info["rows"] = rows
+
+
+def server_timing(timings: dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, sizes, rows, stage timings and peak-memory growth.
+
+    Adds a Server-Timing header with the stages the endpoint recorded via
+    `record()`. Requests that match no route are counted under "unmatched"
+    so clients cannot blow up label cardinality.
+    """
+
+    def __init__(self, app, skip_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        peak_before = _peak_rss()
+        info = scope.setdefault(SCOPE_KEY, {"timings": {}, "rows": None})
+        state = {"status": 500, "in": 0, "out": 0}
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["in"] += len(message.get("body", b""))
+            return message
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                value = server_timing(info["timings"], time.perf_counter() - start)
+                message = {**message, "headers": list(message.get("headers", [])) +
+                           [(b"server-timing", value.encode("latin-1"))]}
+            elif message["type"] == "http.response.body":
+                state["out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_timed)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(endpoint, scope["method"], str(state["status"]),
+                                    value=time.perf_counter() - start)
+            for stage, seconds in info["timings"].items():
+                STAGE_SECONDS.observe(endpoint, stage, value=seconds)
+            if info["rows"] is not None:
+                REQUEST_ROWS.observe(endpoint, value=info["rows"])
+            REQUEST_BYTES.observe(endpoint, value=state["in"])
+            RESPONSE_BYTES.observe(endpoint, value=state["out"])
+            peak = _peak_rss()
+            if peak is not None:
+                MEMORY_PEAK.set(value=peak)
+                if peak > peak_before:
+                    MEMORY_PEAK_GROWTH.inc(endpoint, value=peak - peak_before)
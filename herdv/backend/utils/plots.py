@@ -0,0 +1,98 @@
+# backend/utils/plots.py
+from io import BytesIO
+
+import numpy as np
+
+# Trees with more leaves than this are truncated to their last DEFAULT_LASTP
+# merges unless the caller picks a truncation explicitly
+MAX_FULL_LEAVES = 500
+DEFAULT_LASTP = 100
+TRUNCATE_MODES = ("auto", "none", "lastp", "level")
+
+
+def _dendrogram_args(Z: np.ndarray, truncate_mode: str, p: int | None) -> dict:
+    if truncate_mode not in TRUNCATE_MODES:
+        raise ValueError(f"Invalid truncate_mode. Use one of: {', '.join(TRUNCATE_MODES)}.")
+    if p is not None and p < 1:
+        raise ValueError("p must be at least 1.")
+    n_leaves = Z.shape[0] + 1
+    if truncate_mode == "auto":
+        truncate_mode = "lastp" if n_leaves > MAX_FULL_LEAVES else "none"
+        p = p or DEFAULT_LASTP
+    if truncate_mode == "none":
+        return {"truncate_mode": None, "p": 30}
+    if p is None:
+        p = DEFAULT_LASTP if truncate_mode == "lastp" else 10
+    return {"truncate_mode": truncate_mode, "p": int(p)}
+
+
+def dendrogram_coords(Z: np.ndarray, truncate_mode: str = "auto", p: int | None = None) -> dict:
+    """Merge coordinates of a (possibly truncated) dendrogram for client-side drawing.
+
+    Each link i is the polyline through (icoord[i][j], dcoord[i][j]); `ivl`
+    labels the leaves left to right ("(n)" for a truncated subtree of n).
+    """
+    from scipy.cluster.hierarchy import dendrogram
+
+    args = _dendrogram_args(Z, truncate_mode, p)
+    d = dendrogram(Z, no_plot=True, no_labels=True, **args)
+    return {
+        "truncate_mode": args["truncate_mode"] or "none",
+        "p": args["p"] if args["truncate_mode"] else None,
+        "n_leaves": int(Z.shape[0] + 1),
+        "icoord": d["icoord"],
+        "dcoord": d["dcoord"],
+        "ivl": d["ivl"],
+        "color_list": d["color_list"],
+    }
+
+
+def dendrogram_png(Z: np.ndarray, truncate_mode: str = "auto", p: int | None = None,
+                   width: float = 10, height: float = 6) -> bytes:
+    """Render a dendrogram to PNG on a standalone Figure (no pyplot global state)."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from scipy.cluster.hierarchy import dendrogram
+
+    args = _dendrogram_args(Z, truncate_mode, p)
+    fig = Figure(figsize=(width, height))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    dendrogram(Z, ax=ax, no_labels=args["truncate_mode"] is None, **args)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def distribution_grid_png(dist: dict, features: list[str] | None = None, ncols: int = 4,
+                          panel_width: float = 3.2, panel_height: float = 2.6, titles: dict | None = None) -> bytes:
+    """Render per-cluster boxplots of several features as one PNG grid.
+
+    Draws from precomputed statistics (see models.distributions) with
+    Axes.bxp, so no raw data is needed; clusters without values are left out.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    features = list(dist["features"]) if features is None else features
+    ncols = max(1, min(ncols, len(features)))
+    nrows = -(-len(features) // ncols)
+    fig = Figure(figsize=(panel_width * ncols, panel_height * nrows))
+    FigureCanvasAgg(fig)
+    for i, feature in enumerate(features):
+        ax = fig.add_subplot(nrows, ncols, i + 1)
+        e = dist["features"][feature]
+        boxes = [{"label": str(c), "med": e["median"][j], "q1": e["q1"][j], "q3": e["q3"][j],
+                  "whislo": e["whisker_low"][j], "whishi": e["whisker_high"][j], "mean": e["mean"][j],
+                  "fliers": e["outliers"][j]}
+                 for j, c in enumerate(dist["clusters"]) if e["n"][j]]
+        if boxes:
+            ax.bxp(boxes)
+        ax.set_title((titles or {}).get(feature, feature), fontsize=9)
+        ax.set_xlabel("Cluster", fontsize=8)
+        ax.tick_params(labelsize=7)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
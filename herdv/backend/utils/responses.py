@@ -0,0 +1,143 @@
+# backend/utils/responses.py
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+try:  # optional: several times faster than the stdlib encoder on large payloads
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # optional: binary encoding for clients that ask for it
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Top-level sections of a /cluster response, in their historical order
+SECTIONS = ["assignments", "clusters", "kpis", "feature_names", "labeled_records", "clustering"]
+LAYOUTS = ("rows", "columns")
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def parse_fields(fields: str | None) -> list[str]:
+    """Turn a comma-separated section selector into a list; None selects everything."""
+    if not fields:
+        return list(SECTIONS)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}. Use any of: {', '.join(SECTIONS)}.")
+    return [f for f in SECTIONS if f in selected]
+
+
+def frame_payload(df: pd.DataFrame, layout: str = "rows"):
+    """Encode a frame as row dicts or as a {column: values} mapping; NaN becomes null."""
+    if df.isna().to_numpy().any():
+        df = df.astype(object).where(df.notna(), None)
+    if layout == "columns":
+        return {str(c): df[c].tolist() for c in df.columns}
+    return df.to_dict(orient="records")
+
+
+def assignments_frame(df_labeled: pd.DataFrame) -> pd.DataFrame:
+    return df_labeled[["ID", "Cluster"]].rename(columns={"Cluster": "cluster_id"})
+
+
+def check_page(offset: int, limit: int | None):
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset and limit must not be negative.")
+
+
+def records_page(df: pd.DataFrame, offset: int = 0, limit: int | None = None) -> pd.DataFrame:
+    check_page(offset, limit)
+    stop = None if limit is None else offset + limit
+    return df.iloc[offset:stop]
+
+
+def cluster_response(run_id: str, run: dict, fields: list[str], records_offset: int = 0,
+                     records_limit: int | None = None, layout: str = "rows") -> dict:
+    """Build the /cluster body for a stored run with only the selected sections.
+
+    `labeled_records` can be paged with records_offset/records_limit; the
+    page bounds and total are reported under `labeled_records_page`.
+    """
+    body = {"run_id": run_id}
+    summary = run["summary"]
+    df = run["df"]
+    for field in fields:
+        if field == "assignments":
+            body[field] = frame_payload(assignments_frame(df), layout)
+        elif field == "labeled_records":
+            # include labeled full records so frontends can show per-animal features
+            page = records_page(df, records_offset, records_limit)
+            body[field] = frame_payload(page, layout)
+            if records_offset or records_limit is not None:
+                body["labeled_records_page"] = {"offset": records_offset, "limit": records_limit,
+                                                "total": len(df)}
+        else:
+            body[field] = summary[field]
+    return body
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def wants(accept: str | None, media_types) -> bool:
+    if not accept:
+        return False
+    offered = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+    return any(m in offered for m in media_types)
+
+
+def render(payload, accept: str | None = None, status_code: int = 200) -> Response:
+    """Encode a payload as msgpack when the client asks for it, else as JSON."""
+    if msgpack is not None and wants(accept, MSGPACK_MEDIA_TYPES):
+        return Response(content=msgpack.packb(payload, default=_default, use_bin_type=True),
+                        media_type=MSGPACK_MEDIA_TYPES[0], status_code=status_code)
+    return Response(content=encode_json(payload), media_type=JSON_MEDIA_TYPE, status_code=status_code)
+
+
+def cache_key(*parts) -> str:
+    """Stable hex key for a tuple of request parameters."""
+    return hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=20).hexdigest()
+
+
+def etag(*parts) -> str:
+    """Strong ETag for a response determined entirely by `parts` (e.g. run_id and query)."""
+    return f'"{cache_key(*parts)}"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    """Whether an If-None-Match header matches `tag` (weak comparison, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or tag in [t[2:] if t.startswith("W/") else t for t in candidates]
+
+
+def arrow_response(df: pd.DataFrame) -> Response:
+    """Encode a frame as an Arrow IPC stream (requires pyarrow)."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
@@ -24,3 +24,23 @@ NUMERIC = [
     "Ear_Temperature_C","Parasite_Load_Index","Fecal_Egg_Count","Respiration_Rate_BPM",
     "Forage_Quality_Index","Movement_Score","Remaining_Months"
 ]
+
+# Values of a BOOLEAN column (compared as stripped, lower-cased strings) that mean True
+TRUE_VALUES = ["1", "true", "yes", "y", "t"]
+
+# Optional grouping columns: which member herd an animal belongs to and the
+# season it was measured in (used by /cluster?season= and /cluster/batch)
+HERD_COL = "Herd"
+SEASON_COL = "Season"
+
+# Raw collar / ear-tag readings (POST /datasets/{id}/readings): one row per
+# animal and timestamp with any of these reading columns. Each maps to the
+# feature it feeds and how a day of readings reduces to one value: "sum" for
+# per-interval totals, "mean" for spot measurements.
+TIMESTAMP_COL = "Timestamp"
+SENSOR_READINGS = {
+    "Rumination_Minutes": ("Rumination_Minutes_Per_Day", "sum"),
+    "Ear_Temperature_C": ("Ear_Temperature_C", "mean"),
+    "Respiration_Rate_BPM": ("Respiration_Rate_BPM", "mean"),
+    "Movement_Score": ("Movement_Score", "mean"),
+}
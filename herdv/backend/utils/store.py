@@ -0,0 +1,213 @@
+# backend/utils/store.py
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from backend.utils.metrics import CACHE_LOOKUPS
+
+# Defaults for the process-wide result store used by the API
+RESULT_MAX_ENTRIES = int(os.environ.get("HERDV_RESULT_MAX_ENTRIES", "32"))
+RESULT_TTL_SECONDS = float(os.environ.get("HERDV_RESULT_TTL_SECONDS", "3600"))
+RESULT_MAX_BYTES = int(os.environ.get("HERDV_RESULT_MAX_BYTES", str(512 * 1024 * 1024)))
+# Directory shared by all workers; unset keeps results in this process only
+RESULT_DISK_DIR = os.environ.get("HERDV_RESULT_DISK_DIR") or None
+
+_HEX_ID = re.compile(r"[0-9a-f]+")
+
+
+def is_hex_id(value: str) -> bool:
+    """Whether `value` has the form of the IDs this service hands out.
+
+    Run and dataset IDs come from clients and end up in file names, so
+    anything but lowercase hex is turned away before it reaches a path.
+    """
+    return _HEX_ID.fullmatch(value) is not None
+
+
+def estimate_nbytes(obj, _seen=None) -> int:
+    """Rough deep size of a stored result, dominated by frames and arrays."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(k, _seen) + estimate_nbytes(v, _seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(estimate_nbytes(v, _seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return estimate_nbytes(vars(obj), _seen)
+    return sys.getsizeof(obj)
+
+
+class ResultStore:
+    """Thread-safe LRU store of clustering runs keyed by run ID.
+
+    Entries expire after `ttl_seconds` and the least recently used ones are
+    evicted once either `max_entries` or the `max_bytes` memory budget is
+    exceeded. With `disk_dir` set, every run is also pickled there so other
+    workers pointed at the same directory can serve it without recomputing.
+    A store given a `name` counts hits and misses, in stats() and as the
+    herdv_cache_lookups_total metric.
+    """
+
+    def __init__(self, max_entries: int = RESULT_MAX_ENTRIES, ttl_seconds: float = RESULT_TTL_SECONDS,
+                 max_bytes: int = RESULT_MAX_BYTES, disk_dir: str | None = RESULT_DISK_DIR,
+                 name: str | None = None):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries: OrderedDict[str, tuple[float, int, dict]] = OrderedDict()
+        self._nbytes = 0
+        self._latest: str | None = None
+        self._lock = threading.Lock()
+
+    def put(self, result: dict, run_id: str | None = None) -> str:
+        run_id = run_id or uuid.uuid4().hex
+        size = estimate_nbytes(result)
+        with self._lock:
+            self._insert(run_id, time.time(), size, result)
+            self._latest = run_id
+        if self.disk_dir:
+            self._write_disk(run_id, result)
+        return run_id
+
+    def get(self, run_id: str) -> dict | None:
+        result = self._get(run_id)
+        if self.name is not None:
+            outcome = "miss" if result is None else "hit"
+            with self._lock:
+                if result is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            CACHE_LOOKUPS.inc(self.name, outcome)
+        return result
+
+    def _get(self, run_id: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(run_id)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(run_id)
+                    return entry[2]
+                self._remove(run_id)
+        if not self.disk_dir:
+            return None
+        result, created = self._read_disk(run_id)
+        if result is None:
+            return None
+        with self._lock:
+            self._insert(run_id, created, estimate_nbytes(result), result)
+        return result
+
+    def touch(self, run_id: str) -> bool:
+        """Mark a stored run as most recently used and as the latest run; False if it is gone."""
+        with self._lock:
+            if run_id in self._entries:
+                self._entries.move_to_end(run_id)
+                self._latest = run_id
+                return True
+        if self.disk_dir and self._get(run_id) is not None:
+            with self._lock:
+                self._latest = run_id
+            return True
+        return False
+
+    def latest(self) -> tuple[str | None, dict | None]:
+        """Most recent run stored by this process (for clients that send no run ID)."""
+        run_id = self._latest
+        if run_id is None:
+            return None, None
+        return run_id, self.get(run_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._nbytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    # -- internals (callers hold the lock) --
+
+    def _insert(self, run_id: str, created: float, size: int, result: dict):
+        if run_id in self._entries:
+            self._remove(run_id)
+        self._entries[run_id] = (created, size, result)
+        self._nbytes += size
+        self._evict()
+
+    def _remove(self, run_id: str):
+        _, size, _ = self._entries.pop(run_id)
+        self._nbytes -= size
+
+    def _evict(self):
+        now = time.time()
+        for run_id in [r for r, (created, _, _) in self._entries.items() if now - created > self.ttl_seconds]:
+            self._remove(run_id)
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    # -- shared on-disk backend --
+
+    def _path(self, run_id: str) -> str:
+        if not is_hex_id(run_id):
+            raise KeyError(run_id)
+        return os.path.join(self.disk_dir, f"{run_id}.pkl")
+
+    def _write_disk(self, run_id: str, result: dict):
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Atomic rename so other workers never see a half-written file
+        os.replace(tmp, self._path(run_id))
+        self._sweep_disk()
+
+    def _read_disk(self, run_id: str):
+        try:
+            path = self._path(run_id)
+            created = os.path.getmtime(path)
+            if time.time() - created > self.ttl_seconds:
+                return None, None
+            with open(path, "rb") as f:
+                return pickle.load(f), created
+        except (KeyError, OSError, pickle.UnpicklingError, EOFError):
+            return None, None
+
+    def _sweep_disk(self):
+        now = time.time()
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,39 @@
+# backend/utils/warmup.py
+import importlib
+import os
+import threading
+import time
+
+# Heavy dependencies that only some endpoints need. They are imported on
+# first use; warm_up() loads them ahead of time.
+HEAVY_MODULES = [
+    "sklearn.preprocessing",
+    "sklearn.cluster",
+    "sklearn.metrics",
+    "scipy.cluster.hierarchy",
+    "matplotlib.figure",
+    "matplotlib.backends.backend_agg",
+    "reportlab.pdfgen.canvas",
+    "reportlab.lib.pagesizes",
+]
+
+# HERDV_EAGER_IMPORTS=1 imports everything with the app (the old behaviour);
+# HERDV_WARMUP=1 imports it in a background thread once the app has started
+EAGER_IMPORTS = os.environ.get("HERDV_EAGER_IMPORTS", "0") == "1"
+WARMUP = os.environ.get("HERDV_WARMUP", "0") == "1"
+
+
+def warm_up(modules=HEAVY_MODULES) -> dict[str, float]:
+    """Import `modules` now and return the seconds each one took."""
+    timings = {}
+    for name in modules:
+        t = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - t
+    return timings
+
+
+def start_warm_up(modules=HEAVY_MODULES) -> threading.Thread:
+    thread = threading.Thread(target=warm_up, args=(modules,), name="herdv-warmup", daemon=True)
+    thread.start()
+    return thread
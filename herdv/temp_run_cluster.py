@@ -1,14 +1,14 @@
 import sys
 sys.path.append(r'E:/applications/finalapp/herdv')
-from backend.models.preprocess import preprocess
-from backend.models.cluster import run_ward, cluster_summary, herd_kpis
+from backend.models.preprocess import fit_preprocess
+from backend.models.cluster import WardTree, cluster_summary, herd_kpis
 import pandas as pd
 p='E:/applications/finalapp/sample_csv/sample.csv'
 df=pd.read_csv(p, skipinitialspace=True)
 print('columns:', list(df.columns)[:20])
 try:
-    X, scaler, feature_names, df_clean = preprocess(df)
-    labels = run_ward(X, n_clusters=4)
+    X, encoder, df_clean = fit_preprocess(df)
+    labels = WardTree(X).cut(4)
     df_labeled, means, counts = cluster_summary(df_clean, labels)
     kpis = herd_kpis(df_clean)
     print('rows', len(df))